@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import argparse
+from pathlib import Path
+
+from atopt.core.batch import solve_batch, write_summary
+
+my_parser = argparse.ArgumentParser()
+
+my_parser.add_argument('-r', '--routes', action='store', type=str, nargs='*')
+my_parser.add_argument('-d', '--duties', action='store', type=int, default=-1)
+my_parser.add_argument('-l', '--limit', action='store', type=int, default=-1)
+my_parser.add_argument('-v', '--vehicles', action='store', type=int)
+my_parser.add_argument('-a', '--adjust', action='store', type=int, default=1)
+my_parser.add_argument('-b', '--breaks', action='store', type=int, default=1)
+my_parser.add_argument('-o', '--objective', action='store', type=int, default=1)
+my_parser.add_argument('-u', '--upperbound',
+                       action='store', type=int, default=1)
+my_parser.add_argument('-y', '--symmetry', action='store', type=int, default=0)
+my_parser.add_argument('-w', '--warmstart', action='store', type=int, default=1)
+my_parser.add_argument('-p', '--processes', action='store', type=int)
+my_parser.add_argument('-n', '--workers', action='store', type=int, default=1)
+my_parser.add_argument('-g', '--gap', action='store', type=float)
+my_parser.add_argument('-q', '--stall', action='store', type=float)
+my_parser.add_argument('-e', '--lpbound', action='store', type=int, default=1)
+
+my_parser.add_argument('-s', '--save', action='store', type=str)
+my_parser.add_argument('-f', '--filepath',
+                       action='store',
+                       type=str,
+                       default='Model Data.xlsx')
+
+
+if __name__ == "__main__":
+    args = my_parser.parse_args()
+
+    SAVELOC = Path.cwd().joinpath('sols') if args.save is None else Path(args.save)
+    TIMELIMIT = None if args.limit == -1 else args.limit
+
+    summary = solve_batch(filepath=args.filepath,
+                          routes=args.routes,
+                          adjust_for_traffic=bool(args.adjust),
+                          save_folder=SAVELOC,
+                          processes=args.processes,
+                          workers=args.workers,
+                          time_limit=TIMELIMIT,
+                          nduties=None if args.duties == -1 else args.duties,
+                          add_breaks=bool(args.breaks),
+                          nbuses=args.vehicles,
+                          objective=bool(args.objective),
+                          upper_bound=bool(args.upperbound),
+                          warmstart=bool(args.warmstart),
+                          symmetry_breaking=bool(args.symmetry),
+                          stop_gap=args.gap,
+                          stall_time=args.stall,
+                          lp_bound=bool(args.lpbound))
+
+    print("\n\n-- Batch Summary --\n")
+    print(summary.to_string(index=False))
+    print(f"\nSaved to {write_summary(summary, SAVELOC)}")
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import argparse
+from pathlib import Path
+
+from atopt.core.batch import write_summary
+from atopt.core.benchmark import (compare_baseline, load_baseline,
+                                  run_benchmark, save_baseline)
+
+my_parser = argparse.ArgumentParser()
+
+my_parser.add_argument('-n', '--sizes', action='store', type=int, nargs='*',
+                       default=[50, 200, 1000, 5000])
+my_parser.add_argument('-e', '--depots', action='store', type=int, nargs='*',
+                       default=[1, 3])
+my_parser.add_argument('-k', '--peaks', action='store', type=str, nargs='*',
+                       default=['double'])
+my_parser.add_argument('-x', '--seed', action='store', type=int, default=0)
+my_parser.add_argument('-t', '--buildlimit', action='store', type=int, default=200)
+my_parser.add_argument('-l', '--limit', action='store', type=int, default=60)
+my_parser.add_argument('-z', '--tolerance', action='store', type=float, default=0.25)
+my_parser.add_argument('-w', '--write', action='store', type=int, default=0)
+
+my_parser.add_argument('-s', '--save', action='store', type=str)
+my_parser.add_argument('-b', '--baseline',
+                       action='store',
+                       type=str,
+                       default=str(Path(__file__).parent.joinpath('benchmarks', 'baseline.json')))
+
+
+if __name__ == "__main__":
+    args = my_parser.parse_args()
+
+    SAVELOC = Path.cwd().joinpath('sols') if args.save is None else Path(args.save)
+    BASELINE = Path(args.baseline)
+
+    results = run_benchmark(sizes=args.sizes,
+                            depots=args.depots,
+                            peaks=args.peaks,
+                            seed=args.seed,
+                            build_limit=args.buildlimit,
+                            time_limit=args.limit)
+
+    print("\n\n-- Benchmark --\n")
+    print(results.to_string(index=False))
+    print(f"\nSaved to {write_summary(results, SAVELOC, name='Benchmark')}")
+
+    skipped = results[results['skipped'].notna()]
+    if len(skipped):
+        print("\nStages not measured:")
+        for _, row in skipped.iterrows():
+            print(f"  - {row['case']}: {row['skipped']}")
+
+    if args.write:
+        print(f"\nBaseline written to {save_baseline(results, BASELINE, seed=args.seed)}")
+    elif BASELINE.exists():
+        comparison = compare_baseline(results,
+                                      load_baseline(BASELINE),
+                                      tolerance=args.tolerance)
+
+        print("\n\n-- Baseline Comparison --\n")
+        print(comparison.to_string(index=False))
+
+        flagged = comparison[comparison['flag'] != '']
+        print(f"\n{len(flagged)} of {len(comparison)} measurements flagged")
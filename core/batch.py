@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Union
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from atopt.core.initial import Insertions
+from atopt.core.listener import IncumbentLogger
+from atopt.core.model import BusDriverCSP
+from atopt.core.plot import log_and_plot
+from atopt.utilities import CSPModel, DataProvider, load_routes
+
+summary_columns = ['route', 'status', 'duties', 'LB', 'UB', 'solve_time', 'log_error']
+
+
+def solve_scenario(model: CSPModel,
+                   save_folder: Union[str, Path],
+                   has_traffic: bool = True,
+                   nduties: Optional[int] = None,
+                   add_breaks: bool = True,
+                   nbuses: Optional[int] = None,
+                   objective: bool = True,
+                   upper_bound: bool = True,
+                   warmstart: bool = True,
+                   symmetry_breaking: bool = False,
+                   time_limit: Optional[float] = None,
+                   workers: Optional[int] = None,
+                   log_incumbents: bool = True,
+                   stop_gap: Optional[float] = None,
+                   stall_time: Optional[float] = None,
+                   target: Optional[int] = None,
+                   lp_bound: bool = True) -> dict:
+    # Runs in a worker process, so the figures are written to PNG files
+    # instead of being shown and any failure is reported in the summary
+    # rather than stopping the other runs
+    plt.switch_backend('Agg')
+
+    summary = dict.fromkeys(summary_columns)
+
+    try:
+        if not model.trips:
+            model.build_model()
+        if lp_bound:
+            model.tighten_minimum_duties()
+        summary['LB'] = int(model.minimum_duties)
+
+        NDUTIES = int(model.minimum_duties * 1.5) + 1 if nduties is None else nduties
+
+        initial = None
+        ub = NDUTIES if nduties is not None else None
+        if upper_bound or warmstart:
+            initial = Insertions(model)
+            initial.solve()
+
+            if upper_bound and nduties is None:
+                ub = len(initial.duties)
+                NDUTIES = min(NDUTIES, ub)
+
+        summary['UB'] = ub
+
+        cp_model, model_info = BusDriverCSP(model=model,
+                                            nduties=NDUTIES,
+                                            add_breaks=add_breaks,
+                                            nbuses=nbuses,
+                                            objective=objective,
+                                            ub=ub,
+                                            symmetry_breaking=symmetry_breaking,
+                                            stop_gap=stop_gap,
+                                            stall_time=stall_time,
+                                            target=target)
+
+        if warmstart:
+            cp_model.set_starting_point(initial.starting_point(model_info))
+
+        save_loc = Path(save_folder)
+
+        if log_incumbents:
+            date_str = datetime.now().strftime('[%Y-%m-%d %H-%M]')
+            incumbents = save_loc.joinpath(
+                f"{date_str}-I-[Breaks={add_breaks}-Traffic={has_traffic}-Buses={nbuses}].jsonl")
+            cp_model.add_solver_listener(IncumbentLogger(model_info, incumbents))
+
+        cpsol = cp_model.solve(TimeLimit=time_limit,
+                               Workers=workers,
+                               LogVerbosity='Quiet')
+
+        summary['status'] = cpsol.get_solve_status()
+        summary['solve_time'] = round(cpsol.get_solve_time(), 2)
+
+        if cpsol.is_solution():
+            summary['duties'] = sum(1 for duty in model_info['duties'] if cpsol[duty])
+
+            # A failure while writing the files doesn't undo the solve
+            try:
+                save_loc.mkdir(parents=True, exist_ok=True)
+
+                log_and_plot(sol=cpsol,
+                             model_info=model_info,
+                             save_folder=save_loc,
+                             has_breaks=add_breaks,
+                             has_traffic=has_traffic,
+                             show=False,
+                             verbose=False)
+            except Exception as e:
+                summary['log_error'] = str(e).splitlines()[0]
+    except Exception as e:
+        summary['status'] = f"Error: {str(e).splitlines()[0]}"
+
+    return summary
+
+
+def solve_route(data_provider: DataProvider,
+                save_folder: Union[str, Path],
+                **kwargs) -> dict:
+    summary = solve_scenario(CSPModel(data_provider=data_provider),
+                             save_folder=save_folder,
+                             has_traffic=data_provider.traffic_adjusted,
+                             **kwargs)
+    summary['route'] = data_provider.route
+
+    return summary
+
+
+def solve_batch(filepath: str,
+                routes: Optional[List[str]] = None,
+                adjust_for_traffic: bool = True,
+                save_folder: Union[str, Path] = 'sols',
+                processes: Optional[int] = None,
+                workers: int = 1,
+                time_limit: Optional[float] = None,
+                **kwargs) -> pd.DataFrame:
+    # Every route is solved by its own CP Optimizer with the given number
+    # of workers, and by default the pool runs as many routes at a time as
+    # fit in the available cores
+    providers = load_routes(filepath,
+                            routes=routes,
+                            adjust_for_traffic=adjust_for_traffic)
+
+    if not providers:
+        return pd.DataFrame(columns=summary_columns)
+
+    if processes is None:
+        processes = max(1, (os.cpu_count() or 1) // max(1, workers))
+
+    save_loc = Path(save_folder)
+    summaries = []
+
+    with ProcessPoolExecutor(max_workers=min(processes, len(providers))) as pool:
+        futures = {pool.submit(solve_route,
+                               data_provider=provider,
+                               save_folder=save_loc.joinpath(route),
+                               time_limit=time_limit,
+                               workers=workers,
+                               **kwargs): route
+                   for route, provider in providers.items()}
+
+        for future in as_completed(futures):
+            summary = future.result()
+            print(f"Route {summary['route']}: {summary['status']} ({summary['duties']} duties)")
+            summaries.append(summary)
+
+    order = {route: i for i, route in enumerate(providers)}
+    summaries.sort(key=lambda x: order[x['route']])
+
+    return pd.DataFrame(summaries, columns=summary_columns).astype(
+        {'duties': 'Int64', 'LB': 'Int64', 'UB': 'Int64'})
+
+
+def solve_sweep(filepath: str,
+                route: str,
+                breaks: List[bool] = (True,),
+                traffic: List[bool] = (True,),
+                nbuses: List[Optional[int]] = (None,),
+                nduties: List[Optional[int]] = (None,),
+                save_folder: Union[str, Path] = 'sols',
+                cpus: Optional[int] = None,
+                workers: int = 1,
+                time_limit: Optional[float] = None,
+                **kwargs) -> pd.DataFrame:
+    # The route is parsed and its model is built once per traffic setting.
+    # The scenarios only differ in the constraints added to the CP model, so
+    # they all start from the same precomputed trips, bounds and indices.
+    # At most cpus // workers scenarios run at a time
+    models = {}
+    for adjust_for_traffic in traffic:
+        model = CSPModel(data_provider=DataProvider(filepath=filepath,
+                                                    route=route,
+                                                    adjust_for_traffic=adjust_for_traffic))
+        model.build_model()
+        if kwargs.get('lp_bound', True):
+            model.tighten_minimum_duties()
+        models[adjust_for_traffic] = model
+
+    scenarios = [{'traffic': adjust_for_traffic,
+                  'breaks': add_breaks,
+                  'buses': buses,
+                  'nduties': ndts}
+                 for adjust_for_traffic in traffic
+                 for add_breaks in breaks
+                 for buses in nbuses
+                 for ndts in nduties]
+
+    if cpus is None:
+        cpus = os.cpu_count() or 1
+    processes = max(1, cpus // max(1, workers))
+
+    save_loc = Path(save_folder).joinpath(route)
+    summaries = [None] * len(scenarios)
+
+    # Vehicle limits below the minimum fleet of the route are
+    # infeasible, so they are reported without starting a solve
+    pending = []
+    for i, scenario in enumerate(scenarios):
+        model = models[scenario['traffic']]
+        if scenario['buses'] is not None and scenario['buses'] < model.minimum_buses:
+            summaries[i] = {**scenarios[i],
+                            'route': route,
+                            'status': f"Infeasible: needs at least {model.minimum_buses} vehicles",
+                            'LB': int(model.minimum_duties)}
+            print(f"Scenario {scenarios[i]}: {summaries[i]['status']}")
+        else:
+            pending.append(i)
+
+    with ProcessPoolExecutor(max_workers=max(1, min(processes, len(pending)))) as pool:
+        futures = {}
+        for i in pending:
+            scenario = scenarios[i]
+            # Runs that only differ in the number of duty variables
+            # would otherwise write files with the same names
+            folder = save_loc if scenario['nduties'] is None else save_loc.joinpath(
+                f"Duties={scenario['nduties']}")
+
+            future = pool.submit(solve_scenario,
+                                 model=models[scenario['traffic']],
+                                 save_folder=folder,
+                                 has_traffic=scenario['traffic'],
+                                 nduties=scenario['nduties'],
+                                 add_breaks=scenario['breaks'],
+                                 nbuses=scenario['buses'],
+                                 time_limit=time_limit,
+                                 workers=workers,
+                                 **kwargs)
+            futures[future] = i
+
+        for future in as_completed(futures):
+            i = futures[future]
+            summary = future.result()
+            summary['route'] = route
+            summaries[i] = {**scenarios[i], **summary}
+            print(f"Scenario {scenarios[i]}: {summary['status']} ({summary['duties']} duties)")
+
+    columns = ['route', 'traffic', 'breaks', 'buses', 'nduties'] + summary_columns[1:]
+
+    return pd.DataFrame(summaries, columns=columns).astype(
+        {'buses': 'Int64', 'nduties': 'Int64', 'duties': 'Int64', 'LB': 'Int64', 'UB': 'Int64'})
+
+
+def write_summary(summary: pd.DataFrame,
+                  save_folder: Union[str, Path],
+                  name: str = 'Batch') -> Path:
+    save_loc = Path(save_folder)
+    save_loc.mkdir(parents=True, exist_ok=True)
+
+    date_str = datetime.now().strftime('[%Y-%m-%d %H-%M]')
+    out = save_loc.joinpath(f"{date_str}-{name}.txt")
+
+    with open(out, 'w') as summary_file:
+        summary_file.write(summary.to_string(index=False))
+        summary_file.write('\n')
+
+    return out
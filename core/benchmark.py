@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import json
+import platform
+import tempfile
+import time as timer
+from datetime import datetime
+from pathlib import Path
+from typing import List, Union
+
+import pandas as pd
+
+from atopt.core.initial import Insertions
+from atopt.core.model import BusDriverCSP
+from atopt.utilities import CSPModel, DataProvider
+from atopt.utilities.synthetic import synthetic_route, write_synthetic_workbook
+
+stage_columns = ['load', 'setup', 'insertions', 'build', 'first_feasible']
+benchmark_columns = ['case', 'trips', 'depots', 'peak'] + stage_columns + ['duties', 'status', 'skipped']
+
+
+def case_name(ntrips: int, ndepots: int, peak: str) -> str:
+    return f"{peak}-{ntrips}x{ndepots}"
+
+
+def run_case(filepath: Union[str, Path],
+             route: str,
+             build_limit: int = 200,
+             time_limit: float = 60) -> dict:
+    # Times each stage of a run the same way main.py goes through them.
+    # The workbook is parsed without the cache, and the solve stops at the
+    # first solution without a starting point, so it measures the search
+    # itself. Routes longer than the build limit skip the CP model, since
+    # the deadhead constraints of multiple depots grow too fast for it, and
+    # models over the size limit of the installed CP Optimizer skip the
+    # solve. Either way the reason is kept, so a skipped stage is never
+    # taken for a missing measurement
+    record = dict.fromkeys(stage_columns + ['duties', 'status', 'skipped'])
+
+    started = timer.perf_counter()
+    data_provider = DataProvider(filepath=str(filepath), route=route, use_cache=False)
+    record['load'] = timer.perf_counter() - started
+
+    started = timer.perf_counter()
+    model = CSPModel(data_provider=data_provider)
+    model.build_model()
+    record['setup'] = timer.perf_counter() - started
+
+    started = timer.perf_counter()
+    initial = Insertions(model)
+    initial.solve()
+    record['insertions'] = timer.perf_counter() - started
+    record['duties'] = len(initial.duties)
+
+    if len(model.trips) > build_limit:
+        record['status'] = 'Skipped'
+        record['skipped'] = f"build and solve, over the build limit of {build_limit} trips"
+        return record
+
+    started = timer.perf_counter()
+    cp_model, _ = BusDriverCSP(model=model,
+                               nduties=len(initial.duties),
+                               ub=len(initial.duties))
+    record['build'] = timer.perf_counter() - started
+
+    try:
+        started = timer.perf_counter()
+        cpsol = cp_model.solve(TimeLimit=time_limit,
+                               SolutionLimit=1,
+                               Workers=1,
+                               LogVerbosity='Quiet')
+        record['first_feasible'] = timer.perf_counter() - started
+        record['status'] = cpsol.get_solve_status()
+    except Exception as e:
+        message = str(e).splitlines()[0]
+        if 'size limit' in message:
+            record['status'] = 'Skipped'
+            record['skipped'] = "solve, over the problem size limit of the CP Optimizer edition"
+        else:
+            record['status'] = f"Error: {message}"
+
+    return record
+
+
+def run_benchmark(sizes: List[int] = (50, 200, 1000, 5000),
+                  depots: List[int] = (1, 3),
+                  peaks: List[str] = ('double',),
+                  seed: int = 0,
+                  build_limit: int = 200,
+                  time_limit: float = 60) -> pd.DataFrame:
+    cases = [(ntrips, ndepots, peak)
+             for peak in peaks
+             for ndepots in depots
+             for ntrips in sizes]
+
+    records = []
+
+    with tempfile.TemporaryDirectory() as folder:
+        filepath = write_synthetic_workbook(
+            Path(folder).joinpath('Synthetic Data.xlsx'),
+            {case_name(*case): synthetic_route(*case, seed=seed) for case in cases})
+
+        for ntrips, ndepots, peak in cases:
+            name = case_name(ntrips, ndepots, peak)
+            record = run_case(filepath, name, build_limit=build_limit, time_limit=time_limit)
+            records.append({'case': name, 'trips': ntrips, 'depots': ndepots, 'peak': peak, **record})
+            skipped = f", skipped {record['skipped']}" if record['skipped'] else ""
+            print(f"Case {name}: {record['status']} ({record['duties']} duties{skipped})")
+
+    return pd.DataFrame(records, columns=benchmark_columns).round(
+        {column: 3 for column in stage_columns})
+
+
+def save_baseline(results: pd.DataFrame, filepath: Union[str, Path], seed: int = 0) -> Path:
+    out = Path(filepath)
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    baseline = {
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'machine': platform.platform(),
+        'python': platform.python_version(),
+        'seed': seed,
+        'cases': json.loads(results.to_json(orient='records')),
+    }
+
+    with open(out, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2)
+        baseline_file.write('\n')
+
+    return out
+
+
+def load_baseline(filepath: Union[str, Path]) -> pd.DataFrame:
+    with open(filepath) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    return pd.DataFrame(baseline['cases'], columns=benchmark_columns)
+
+
+def compare_baseline(results: pd.DataFrame,
+                     baseline: pd.DataFrame,
+                     tolerance: float = 0.25,
+                     min_delta: float = 0.05) -> pd.DataFrame:
+    # A stage regresses when it is slower than the baseline by more than
+    # the relative tolerance and by more than min_delta seconds, which
+    # keeps the millisecond stages from flagging on timer noise. A change
+    # in the number of duties built by Insertions is flagged on its own,
+    # since the routes are generated from the same seed
+    merged = results.merge(baseline, on='case', how='left', suffixes=('', '_baseline'))
+
+    rows = []
+    for _, row in merged.iterrows():
+        for stage in stage_columns:
+            current, previous = row[stage], row[f"{stage}_baseline"]
+            if pd.isna(current) or pd.isna(previous):
+                continue
+
+            if previous > 0:
+                ratio = current / previous
+            else:
+                ratio = 1.0 if current == 0 else float('inf')
+            is_slower = ratio > 1 + tolerance and current - previous > min_delta
+            rows.append({'case': row['case'],
+                         'stage': stage,
+                         'baseline': previous,
+                         'current': current,
+                         'ratio': round(ratio, 2),
+                         'flag': 'slower' if is_slower else ''})
+
+        if not pd.isna(row['duties_baseline']) and row['duties'] != row['duties_baseline']:
+            rows.append({'case': row['case'],
+                         'stage': 'duties',
+                         'baseline': row['duties_baseline'],
+                         'current': row['duties'],
+                         'ratio': round(row['duties'] / row['duties_baseline'], 2),
+                         'flag': 'changed'})
+
+    return pd.DataFrame(rows, columns=['case', 'stage', 'baseline', 'current', 'ratio', 'flag'])
+
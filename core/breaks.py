@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Tuple
+
+import numpy as np
+from atopt.utilities import CSPModel
+from docplex.cp.model import *
+
+
+def add_breaks_model(cp_model: CpoModel,
+                     model: CSPModel,
+                     duties: List[CpoIntervalVar],
+                     trip2duty: Dict[Tuple[int, int], CpoIntervalVar],
+                     duty_trips: List[List[int]]) -> List[CpoIntervalVar]:
+    # A trip goes before the break of its duty when the driving time up to
+    # its end is within the continuous driving limit, and after it otherwise.
+    # Trip times are fixed, so the driving time before a trip is a prefix sum
+    # over the duty's trips ordered by end time. Each prefix is built once on
+    # top of the previous one, and a trip only needs the prefix of the trips
+    # that end before it starts
+    continuous_driving = model.constraints.continuous_driving
+
+    breaks = [interval_var(size=model.constraints.break_time,
+                           name=f"BreakTime_{i}",
+                           optional=True)
+              for i in range(len(duties))]
+
+    for d, duty in enumerate(duties):
+        cp_model.add(presence_of(breaks[d]) == presence_of(duty))
+
+        if not duty_trips[d]:
+            continue
+
+        trips = np.array(duty_trips[d])
+        by_end = trips[np.argsort(model.end_times[trips], kind='stable')]
+
+        prefix = [0]
+        for t in by_end:
+            prefix.append(prefix[-1] + model.durations[t] * presence_of(trip2duty[(t, d)]))
+
+        previous = np.searchsorted(model.end_times[by_end],
+                                   model.start_times[trips],
+                                   side='right')
+
+        for t, k in zip(duty_trips[d], previous):
+            driving = prefix[k] + model.durations[t]
+            is_present = presence_of(trip2duty[(t, d)])
+
+            cp_model.add(
+                if_then(
+                    logical_and(driving <= continuous_driving, is_present),
+                    start_of(breaks[d]) >= model.end_times[t]))
+            cp_model.add(
+                if_then(
+                    logical_and(driving > continuous_driving, is_present),
+                    end_of(breaks[d]) <= model.start_times[t]))
+
+    return breaks
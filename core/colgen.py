@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import time as timer
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from atopt.core.improve import LocalSearch, State
+from atopt.core.initial import Insertions
+from atopt.utilities import *
+
+try:
+    from scipy.optimize import linprog
+    from scipy.sparse import csc_matrix
+except ImportError:
+    linprog = None
+
+# A partial duty in the pricing problem: reduced cost so far,
+# duty state after its last trip, and the trip positions it runs
+Label = Tuple[float, State, Tuple[int, ...]]
+
+
+class ColumnGeneration(LocalSearch):
+    # Set partitioning over duties. The restricted master LP is solved over
+    # the duties found so far and its duals price new duties, built as
+    # resource constrained paths over the compatibility graph with the same
+    # rules as Duty.can_add_trip and Duty.add_trip. Pricing keeps the
+    # cheapest non-dominated labels per trip and only extends a duty to trips
+    # starting within max_wait minutes, so it is a heuristic and the master
+    # LP value is not a proved bound. Integer duties come from diving: once
+    # no new duty prices out, the duty the LP runs the most is fixed, along
+    # with the other duties it runs in full that share no trip with a fixed
+    # one, and the rest of the trips are priced again. The result replaces
+    # the initial duties if it has fewer
+    def __init__(self,
+                 model: CSPModel,
+                 initial: Insertions,
+                 time_limit: float = 60,
+                 max_labels: int = 10,
+                 max_wait: int = 120,
+                 columns_per_iteration: int = 100) -> None:
+        if linprog is None:
+            raise ImportError("The column generation engine requires scipy")
+
+        super().__init__(model, initial, time_limit=time_limit)
+        self.max_labels = max_labels
+        self.columns_per_iteration = columns_per_iteration
+
+        # Successors of every trip that start within max_wait minutes of its end
+        graph = model.compatibility
+        self.successors = []
+        for t in range(len(self.trips)):
+            successors = graph.successors(t)
+            self.successors.append(
+                successors[graph.start_times[successors] <= graph.end_times[t] + max_wait])
+
+        positions = {trip.ID: t for t, trip in enumerate(self.trips)}
+        self.columns: List[Tuple[int, ...]] = []
+        self.known = set()
+
+        for chain in self.chains:
+            self._add_column(tuple(positions[trip.ID] for trip in chain))
+        for t in range(len(self.trips)):
+            self._add_column((t,))
+
+        self.iterations = 0
+        self.master_value = None
+        self.status = 'Initial'
+
+    def _add_column(self, column: Tuple[int, ...]) -> bool:
+        if column in self.known:
+            return False
+
+        self.known.add(column)
+        self.columns.append(column)
+        return True
+
+    def _matrix(self, columns: List[Tuple[int, ...]], rows: np.ndarray) -> csc_matrix:
+        lengths = [len(column) for column in columns]
+        trips = np.fromiter((t for column in columns for t in column),
+                            dtype=np.int64, count=sum(lengths))
+        cols = np.repeat(np.arange(len(columns)), lengths)
+
+        return csc_matrix((np.ones(len(trips)), (rows[trips], cols)),
+                          shape=(rows.max() + 1, len(columns)))
+
+    def _solve_master(self, columns: List[Tuple[int, ...]], active: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Only the trips not yet run by a fixed duty are rows of the master.
+        # Covering instead of partitioning keeps the duals nonnegative and far
+        # less degenerate, so the LP converges faster. Duties it runs in full
+        # can share trips, so the dive checks every duty before fixing it
+        rows = np.cumsum(active) - 1
+        result = linprog(np.ones(len(columns)),
+                         A_ub=-self._matrix(columns, rows),
+                         b_ub=-np.ones(active.sum()),
+                         bounds=(0, None),
+                         method='highs')
+
+        duals = np.zeros(len(self.trips))
+        duals[active] = -result.ineqlin.marginals
+
+        return result.x, duals
+
+    def _dominates(self, label: Label, other: Label) -> bool:
+        # The end time and location are the same at a trip, so a later
+        # start, less driving and an earlier end of break are better
+        _, (start, _, _, driving, continuous, available, _), _ = label
+        _, (o_start, _, _, o_driving, o_continuous, o_available, _), _ = other
+
+        return (start >= o_start and driving <= o_driving and
+                continuous <= o_continuous and available <= o_available)
+
+    def _insert_label(self, labels: List[Label], label: Label) -> None:
+        # Labels are kept sorted by cost, so only the cheaper ones can
+        # dominate the new label and only the dearer ones can be dominated
+        cost = label[0]
+        if len(labels) >= self.max_labels and cost >= labels[-1][0]:
+            return
+
+        k = bisect_right(labels, cost, key=lambda x: x[0])
+        if any(self._dominates(other, label) for other in labels[:k]):
+            return
+
+        labels[k:] = [label] + [other for other in labels[k:] if not self._dominates(label, other)]
+        del labels[self.max_labels:]
+
+    def _price(self, duals: np.ndarray, active: np.ndarray) -> List[Tuple[float, Tuple[int, ...]]]:
+        # Trips are in start time order and every arc goes forward in time,
+        # so each trip's labels are final once all earlier trips are done
+        labels: Dict[int, List[Label]] = {}
+        found = []
+
+        for t in np.flatnonzero(active).tolist():
+            trip = self.trips[t]
+            bucket = labels.setdefault(t, [])
+            self._insert_label(bucket, (1 - duals[t], self._extend(None, trip), (t,)))
+
+            successors = self.successors[t]
+            successors = successors[active[successors]].tolist()
+
+            for cost, state, path in bucket:
+                if cost < -1e-6:
+                    found.append((cost, path))
+
+                for s in successors:
+                    extended = self._extend(state, self.trips[s])
+                    if extended is None:
+                        continue
+                    self._insert_label(labels.setdefault(s, []),
+                                       (cost - duals[s], extended, path + (s,)))
+
+            del labels[t]
+
+        found.sort(key=lambda x: x[0])
+        return found
+
+    def _generate(self, active: np.ndarray, deadline: float) -> Tuple[List[Tuple[int, ...]], np.ndarray]:
+        # Column generation over the active trips, until no duty prices
+        # out or the deadline passes. Returns the master columns and values
+        while True:
+            columns = [column for column in self.columns if active[list(column)].all()]
+            values, duals = self._solve_master(columns, active)
+            self.iterations += 1
+
+            if timer.perf_counter() >= deadline:
+                return columns, values
+
+            added = 0
+            for _, column in self._price(duals, active):
+                if added >= self.columns_per_iteration:
+                    break
+                added += self._add_column(column)
+
+            if not added:
+                return columns, values
+
+    def solve(self):
+        deadline = timer.perf_counter() + self.time_limit
+        active = np.ones(len(self.trips), dtype=bool)
+        fixed = []
+
+        # Past the deadline the dive goes on without pricing,
+        # which only takes one master LP per fixing step
+        while active.any():
+            columns, values = self._generate(active, deadline)
+            if self.master_value is None:
+                self.master_value = values.sum()
+
+            # The master columns only run active trips, so the first one is
+            # always fixed and the later ones only if they are still active
+            order = np.argsort(-values, kind='stable')
+            chosen = [order[0]] + [c for c in order[1:] if values[c] > 1 - 1e-6]
+
+            for c in chosen:
+                column = list(columns[c])
+                if active[column].all():
+                    fixed.append(columns[c])
+                    active[column] = False
+
+        covered = np.bincount([t for column in fixed for t in column], minlength=len(self.trips))
+        if (covered != 1).any():
+            raise RuntimeError(f"Trips {np.flatnonzero(covered != 1).tolist()} "
+                               f"are not run by exactly one duty")
+
+        self.status = 'Time limit' if timer.perf_counter() >= deadline else 'Converged'
+
+        if len(fixed) < len(self.chains):
+            self.chains = [[self.trips[t] for t in column] for column in fixed]
+
+        self._build_duties()
+        self.sol = Solution(self.trips, self.duties, self.constraints)
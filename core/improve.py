@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+import random
+import time as timer
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+
+from atopt.core.initial import Insertions, build_duties
+from atopt.utilities import *
+
+# Duty state after its last trip, mirroring the Duty attributes that
+# can_add_trip and add_trip read:
+# (start_time, end_time, shift_duration, driving_time,
+#  continuous_driving_time, available_from, end_loc)
+State = Tuple[int, int, int, int, int, int, str]
+
+
+class LocalSearch(Insertions):
+    def __init__(self,
+                 model: CSPModel,
+                 initial: Insertions,
+                 time_limit: float = 10,
+                 seed: int = 0) -> None:
+        super().__init__(model)
+        self.time_limit = time_limit
+        self.random = random.Random(seed)
+
+        trips = {trip.ID: trip for trip in self.trips}
+        self.chains: List[List[Trip]] = [[trips[trip.ID] for trip in duty.trips]
+                                         for duty in initial.duties if duty.trips]
+        self.states: List[List[State]] = [self._replay(None, chain)
+                                          for chain in self.chains]
+        self.initial_duties = len(self.chains)
+
+    def _extend(self, state: Optional[State], trip: Trip) -> Optional[State]:
+        c = self.constraints
+
+        if state is None:
+            start, shift, driving, continuous, available = trip.start_time, trip.end_time - trip.start_time, 0, 0, -1
+        else:
+            start, end, shift, driving, continuous, available, end_loc = state
+
+            if end_loc != trip.start_loc:
+                return None
+
+            _rest = trip.start_time - end
+            _continuous = trip.duration if _rest >= c.break_time else continuous + trip.duration
+
+            if any([trip.start_time < end,
+                    trip.start_time < available,
+                    shift + _rest + trip.end_time - trip.start_time > c.shift_span,
+                    driving + trip.duration > c.total_driving,
+                    _continuous > c.continuous_driving]):
+                return None
+
+            if _rest >= c.break_time and available < end:
+                continuous = 0
+
+            shift += _rest + trip.end_time - trip.start_time
+
+        continuous += trip.duration
+        driving += trip.duration
+
+        if c.continuous_driving - continuous < trip.min_duration:
+            available = trip.end_time + c.break_time
+            continuous = 0
+
+        return (start, trip.end_time, shift, driving, continuous, available, trip.end_loc)
+
+    def _replay(self, state: Optional[State], trips: List[Trip]) -> Optional[List[State]]:
+        states = []
+        for trip in trips:
+            state = self._extend(state, trip)
+            if state is None:
+                return None
+            states.append(state)
+
+        return states
+
+    def _try_chain(self, d: int, position: int, trips: List[Trip]) -> Optional[List[State]]:
+        # Only the part of the duty after the first changed position is
+        # replayed, the states before it are reused as they are
+        prefix = self.states[d][:position]
+        states = self._replay(prefix[-1] if prefix else None, trips)
+
+        return None if states is None else prefix + states
+
+    def _insert(self, d: int, trip: Trip) -> Optional[Tuple[List[Trip], List[State]]]:
+        chain = self.chains[d]
+        position = bisect_left([t.start_time for t in chain], trip.start_time)
+
+        if position > 0 and chain[position - 1].end_time > trip.start_time:
+            return None
+        if position < len(chain) and trip.end_time > chain[position].start_time:
+            return None
+
+        states = self._try_chain(d, position, [trip] + chain[position:])
+        if states is None:
+            return None
+
+        return chain[:position] + [trip] + chain[position:], states
+
+    def _eject(self, d: int, trip: Trip) -> Optional[Tuple[Trip, List[Trip], List[State]]]:
+        # Put the trip in duty d in place of a trip it overlaps with,
+        # returning the trip that was pushed out
+        chain = self.chains[d]
+
+        for k, other in enumerate(chain):
+            if other.start_time >= trip.end_time or trip.start_time >= other.end_time:
+                continue
+
+            rest = chain[:k] + chain[k + 1:]
+            position = bisect_left([t.start_time for t in rest], trip.start_time)
+            new_chain = rest[:position] + [trip] + rest[position:]
+
+            first = min(k, position)
+            states = self._try_chain(d, first, new_chain[first:])
+            if states is not None:
+                return other, new_chain, states
+
+        return None
+
+    def _eliminate(self, victim: int) -> bool:
+        # Every trip of the victim duty must find a place in another duty,
+        # directly or by pushing out one trip that fits somewhere else,
+        # otherwise none of the tentative changes is kept
+        saved = {}
+        others = [d for d in range(len(self.chains)) if d != victim]
+
+        def _apply(d, chain, states):
+            saved.setdefault(d, (self.chains[d], self.states[d]))
+            self.chains[d], self.states[d] = chain, states
+
+        def _place(trip, ejections):
+            self.random.shuffle(others)
+            others.sort(key=lambda d: -len(self.chains[d]))
+
+            for d in others:
+                inserted = self._insert(d, trip)
+                if inserted is not None:
+                    _apply(d, *inserted)
+                    return True
+
+            if not ejections:
+                return False
+
+            for d in others:
+                ejected = self._eject(d, trip)
+                if ejected is None:
+                    continue
+
+                other, chain, states = ejected
+                previous = self.chains[d], self.states[d]
+                _apply(d, chain, states)
+
+                if _place(other, ejections - 1):
+                    return True
+
+                self.chains[d], self.states[d] = previous
+
+            return False
+
+        for trip in self.chains[victim]:
+            if not _place(trip, ejections=1):
+                for d, (chain, states) in saved.items():
+                    self.chains[d], self.states[d] = chain, states
+                return False
+
+        del self.chains[victim]
+        del self.states[victim]
+
+        return True
+
+    def _swap(self, a: int, b: int) -> bool:
+        # Exchange two trips with the same endpoints, moving the longer one
+        # into the longer duty to empty the smaller duty faster
+        if len(self.chains[a]) < len(self.chains[b]):
+            a, b = b, a
+
+        for i, trip_b in enumerate(self.chains[b]):
+            for j, trip_a in enumerate(self.chains[a]):
+                if (trip_a.start_loc, trip_a.end_loc) != (trip_b.start_loc, trip_b.end_loc):
+                    continue
+                if trip_b.duration <= trip_a.duration:
+                    continue
+
+                chain_a = self.chains[a][:j] + [trip_b] + self.chains[a][j + 1:]
+                chain_b = self.chains[b][:i] + [trip_a] + self.chains[b][i + 1:]
+
+                states_a = self._try_chain(a, j, chain_a[j:])
+                states_b = self._try_chain(b, i, chain_b[i:]) if states_a else None
+
+                if states_a and states_b:
+                    self.chains[a], self.states[a] = chain_a, states_a
+                    self.chains[b], self.states[b] = chain_b, states_b
+                    return True
+
+        return False
+
+    def _exchange(self, a: int, b: int) -> bool:
+        # Swap the tails of two duties at a common cut time. The exchange is
+        # kept when it doesn't make the duty sizes more even, so the search
+        # can also walk across schedules of equal quality
+        chain_a, chain_b = self.chains[a], self.chains[b]
+        starts_a = [t.start_time for t in chain_a]
+        starts_b = [t.start_time for t in chain_b]
+        before = len(chain_a) ** 2 + len(chain_b) ** 2
+
+        cuts = chain_a[1:] + chain_b[1:]
+        self.random.shuffle(cuts)
+
+        for trip in cuts:
+            i = bisect_left(starts_a, trip.start_time)
+            j = bisect_left(starts_b, trip.start_time)
+
+            new_a = chain_a[:i] + chain_b[j:]
+            new_b = chain_b[:j] + chain_a[i:]
+
+            if not new_a or not new_b or len(new_a) ** 2 + len(new_b) ** 2 < before:
+                continue
+
+            states_a = self._try_chain(a, i, new_a[i:])
+            states_b = self._try_chain(b, j, new_b[j:]) if states_a else None
+
+            if states_a and states_b:
+                self.chains[a], self.states[a] = new_a, states_a
+                self.chains[b], self.states[b] = new_b, states_b
+                return True
+
+        return False
+
+    def _build_duties(self) -> None:
+        # The chains follow the duties, so they stay in duty order
+        positions = {trip.ID: t for t, trip in enumerate(self.trips)}
+        self.duties = build_duties(self.trips,
+                                   [[positions[trip.ID] for trip in chain] for chain in self.chains],
+                                   self.constraints)
+        self.chains = [list(duty.trips) for duty in self.duties]
+
+    def _perturb(self) -> None:
+        # Trip swaps and tail exchanges between random pairs of duties, with
+        # a bias towards the smallest duty that the next elimination targets
+        smallest = min(range(len(self.chains)), key=lambda d: len(self.chains[d]))
+
+        for _ in range(len(self.chains)):
+            a, b = self.random.sample(range(len(self.chains)), 2)
+            if self.random.random() < 0.5 and smallest not in (a, b):
+                b = smallest
+
+            self._swap(a, b) or self._exchange(a, b)
+
+    def solve(self):
+        deadline = timer.perf_counter() + self.time_limit
+
+        while timer.perf_counter() < deadline and len(self.chains) > 1:
+            by_size = sorted(range(len(self.chains)), key=lambda d: len(self.chains[d]))
+
+            if not any(self._eliminate(d) for d in by_size[:3]):
+                self._perturb()
+
+        self._build_duties()
+        self.sol = Solution(self.trips, self.duties, self.constraints)
@@ -1,35 +1,139 @@
 # -*- coding: utf-8 -*-
 from atopt.utilities import *
-from copy import deepcopy
+from dataclasses import replace
+from heapq import heappop, heappush
+from typing import List
+
+from docplex.cp.solution import CpoModelSolution
+
+
+def build_duties(trips: List[Trip], chains: List[List[int]], constraints: Constraints) -> List[Duty]:
+    # Turns chains of trip positions into duties over those trips. Duties
+    # are numbered in the trip order of their first trip, which is the
+    # numbering the duty domains of the model expect
+    duties = []
+
+    for chain in sorted(chains, key=lambda chain: chain[0]):
+        duty = Duty(len(duties), constraints)
+        for t in chain:
+            trip = trips[t]
+            duty.add_trip(trip)
+            trip.is_covered = True
+            trip.duty = duty
+        duties.append(duty)
+
+    return duties
 
 
 class Insertions:
     def __init__(self, model: CSPModel) -> None:
         self.data = model.data.copy()
         self.constraints = model.constraints
-        self.trips = deepcopy(model.trips)
-        self.duties = deepcopy(model.duties)
+        self.trips = [replace(trip) for trip in model.trips]
+        self.duties = list(model.duties)
         self.sol = None
 
+    def _is_closed(self, duty: Duty, trip: Trip) -> bool:
+        # Later trips start no earlier than this one, so a duty that can't
+        # fit even the shortest trip after it will never be used again
+        _working = trip.start_time + trip.min_duration - duty.start_time
+        _total = duty.driving_time + trip.min_duration
+
+        return _working > self.constraints.shift_span or _total > self.constraints.total_driving
+
     def solve(self):
-        max_insertions = len(self.trips)
-        c = 0
+        # Open duties wait in a heap per end location keyed by the time they
+        # are free again. Each trip goes to the duty at its start location
+        # that has been free the longest and can take it, since a long rest
+        # also resets the continuous driving time
+        free = {}
+
+        for trip in sorted(self.trips, key=lambda x: x.start_time):
+            candidates = free.setdefault(trip.start_loc, [])
+
+            duty = None
+            skipped = []
+            while candidates and candidates[0][0] <= trip.start_time:
+                entry = heappop(candidates)
+                _duty = self.duties[entry[1]]
+
+                if _duty.can_add_trip(trip):
+                    duty = _duty
+                    break
+
+                if not self._is_closed(_duty, trip):
+                    skipped.append(entry)
 
-        while c < max_insertions:
-            next_id = len(self.duties)
-            duty = Duty(next_id, self.constraints)
+            for entry in skipped:
+                heappush(candidates, entry)
 
-            for trip in self.trips:
-                if not trip.is_covered and duty.can_add_trip(trip):
-                    duty.add_trip(trip)
-                    trip.is_covered = True
-                    trip.duty = duty
-                    c += 1
+            if duty is None:
+                duty = Duty(len(self.duties), self.constraints)
+                self.duties.append(duty)
 
-            self.duties.append(duty)
+            duty.add_trip(trip)
+            trip.is_covered = True
+            trip.duty = duty
+
+            heappush(free.setdefault(trip.end_loc, []),
+                     (max(duty.end_time, duty.available_from), duty.ID))
 
         self.sol = Solution(self.trips, self.duties, self.constraints)
 
+    def starting_point(self, model_info: dict) -> CpoModelSolution:
+        nduties = model_info.get('nduties')
+        duties = model_info.get('duties')
+        trip2duty = model_info.get('trip2duty')
+        breaks = model_info.get('breaks')
+
+        positions = {trip.ID: t for t, trip in enumerate(self.trips)}
+        assigned = set()
+
+        stp = CpoModelSolution()
+
+        for duty in self.duties[:nduties]:
+            d = duty.ID
+            stp.add_interval_var_solution(duties[d],
+                                          presence=True,
+                                          start=duty.start_time,
+                                          end=duty.end_time)
+
+            for trip in duty.trips:
+                t = positions[trip.ID]
+                if (t, d) in trip2duty:
+                    stp.add_interval_var_solution(trip2duty[(t, d)],
+                                                  presence=True,
+                                                  start=trip.start_time,
+                                                  end=trip.end_time)
+                    assigned.add((t, d))
+
+            # The break follows the last trip that still fits
+            # in the continuous driving limit
+            if breaks is not None:
+                break_start = duty.trips[0].end_time
+                _driving = 0
+                for trip in duty.trips:
+                    _driving += trip.duration
+                    if _driving > self.constraints.continuous_driving:
+                        break
+                    break_start = trip.end_time
+
+                stp.add_interval_var_solution(breaks[d],
+                                              presence=True,
+                                              start=break_start,
+                                              end=break_start + self.constraints.break_time)
+
+        for d in range(len(self.duties), nduties):
+            stp.add_interval_var_solution(duties[d], presence=False)
+            if breaks is not None:
+                stp.add_interval_var_solution(breaks[d], presence=False)
+
+        for key, var in trip2duty.items():
+            if key not in assigned:
+                stp.add_interval_var_solution(var, presence=False)
+
+        return stp
+
 
 if __name__ == "__main__":
     datafile = "C:/Users/aznavouridis.k/OneDrive/_Thesis_/Main Thesis/Model Data.xlsx"
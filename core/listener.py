@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import json
+import time as timer
+from pathlib import Path
+from typing import Optional, Union
+
+from docplex.cp.solution import CpoSolveResult
+from docplex.cp.solver.solver_listener import AutoStopListener, CpoSolverListener
+
+
+class IncumbentLogger(CpoSolverListener):
+    # Writes every solution reported during the solve as one JSON line and
+    # flushes it right away, so the file holds the best assignment found so
+    # far even if the run is killed
+    def __init__(self,
+                 model_info: dict,
+                 filepath: Union[str, Path]) -> None:
+        super().__init__()
+        self.filepath = Path(filepath)
+        self.trip2duty = model_info.get('trip2duty')
+        self.trip_ids = [int(trip.ID) for trip in model_info.get('model').trips]
+
+        self.started = None
+        self.logfile = None
+        self.records = 0
+        self.last = None
+
+    def solver_created(self, solver):
+        # The solver only reports intermediate solutions
+        # when the solve runs as a loop of search_next calls
+        solver.context.solver.solve_with_search_next = True
+
+    def start_solve(self, solver):
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self.logfile = open(self.filepath, 'w')
+        self.started = timer.perf_counter()
+        self.records = 0
+        self.last = None
+
+    def result_found(self, solver, sres: CpoSolveResult):
+        if self.logfile is None or not sres.is_solution():
+            return
+
+        objective = sres.get_objective_values()
+        bound = sres.get_objective_bounds()
+        gap = sres.get_objective_gaps()
+        status = sres.get_solve_status()
+
+        # The result that closes the search repeats the last solution
+        # when the time limit is hit, so only changes are written
+        if (objective, status) == self.last:
+            return
+        self.last = (objective, status)
+
+        assignment = {}
+        for (t, d), var in self.trip2duty.items():
+            if sres.get_var_solution(var).is_present():
+                assignment[self.trip_ids[t]] = d
+
+        record = {
+            'elapsed': round(timer.perf_counter() - self.started, 3),
+            'solve_time': round(sres.get_solve_time(), 3),
+            'status': status,
+            'objective': objective[0] if objective else None,
+            'bound': bound[0] if bound else None,
+            'gap': gap[0] if gap else None,
+            'assignment': assignment,
+        }
+
+        self.logfile.write(json.dumps(record) + '\n')
+        self.logfile.flush()
+        self.records += 1
+
+    def end_solve(self, solver):
+        if self.logfile is not None:
+            self.logfile.close()
+            self.logfile = None
+
+
+class StopCriteria(AutoStopListener):
+    # Stops the search as soon as the best solution is within a relative gap
+    # of the lower bound, reaches a known number of duties, or hasn't improved
+    # for the stall time. The stall clock starts at the first solution, so a
+    # slow first solution isn't taken for a stall. The lower bound is the
+    # best of the given one and the bound the solver has proved
+    def __init__(self,
+                 lower_bound: Optional[float] = None,
+                 gap: Optional[float] = None,
+                 stall_time: Optional[float] = None,
+                 target: Optional[int] = None) -> None:
+        super().__init__(qsc_time=stall_time, min_sols=1)
+        self.lower_bound = lower_bound
+        self.gap = gap
+        self.target = target
+        self.stop_cause = None
+
+    def solver_created(self, solver):
+        solver.context.solver.solve_with_search_next = True
+
+    def _reached(self, sres: CpoSolveResult) -> Optional[str]:
+        objective = sres.get_objective_values()
+        if not objective:
+            return None
+
+        value = objective[0]
+
+        if self.target is not None and value <= self.target:
+            return f"target of {self.target} reached"
+
+        if self.gap is not None and value > 0:
+            bounds = sres.get_objective_bounds()
+            lower = max([b for b in [self.lower_bound, bounds[0] if bounds else None]
+                         if b is not None],
+                        default=None)
+
+            if lower is not None and (value - lower) / value <= self.gap:
+                return f"gap of {(value - lower) / value:.2%} against bound {lower:g}"
+
+        return None
+
+    def result_found(self, solver, sres: CpoSolveResult):
+        if not sres.is_solution():
+            return
+
+        super().result_found(solver, sres)
+
+        cause = self._reached(sres)
+        if cause is not None and self.stop_cause is None:
+            self.stop_cause = cause
+            self._stop_waiting_loop()
+            solver.abort_search()
+
+    def _waiting_loop(self):
+        super()._waiting_loop()
+
+        if self.abort_time is not None and self.abort_time <= timer.time() and self.stop_cause is None:
+            self.stop_cause = f"no improvement for {self.qsc_time:g} seconds"
@@ -2,6 +2,7 @@
 from typing import Optional
 
 import numpy as np
+from atopt.core.breaks import add_breaks_model
 from atopt.core.plot import log_and_plot
 from atopt.utilities import CSPModel, DataProvider
 from docplex.cp.model import *
@@ -14,11 +15,9 @@ def multiple_depot_CSP(model: CSPModel,
                        nbuses: Optional[int] = None,
                        objective: Optional[bool] = True) -> CpoModel:
 
-    min_buses = model.vehicles_boundaries()[1]
-
-    if nbuses is not None and nbuses < min_buses:
+    if nbuses is not None and nbuses < model.minimum_buses:
         raise ValueError(
-            f"Model can't be solved with less than {min_buses} vehicles")
+            f"Model can't be solved with less than {model.minimum_buses} vehicles")
 
     cp_model = CpoModel(name="CSP_Multiple_Depot")
 
@@ -38,9 +37,14 @@ def multiple_depot_CSP(model: CSPModel,
                            optional=True)
               for i in range(NDUTIES)]
 
+    domains = model.duty_domains(NDUTIES)
+
     trip2duty = {}
+    duty_trips = [[] for _ in range(NDUTIES)]
     for t, trip in enumerate(model.trips):
-        for d in range(NDUTIES):
+        for d in domains[t]:
+            if t < NTRIPS:
+                duty_trips[d].append(t)
             trip2duty[(t, d)] = interval_var(start=(trip.start_time, trip.start_time),
                                              end=(trip.end_time, trip.end_time),
                                              size=trip.duration,
@@ -48,81 +52,56 @@ def multiple_depot_CSP(model: CSPModel,
                                              optional=True)
 
     for d in range(NDUTIES):
-        cp_model.add(span(duties[d],
-                          [trip2duty[(t, d)] for t in range(NTRIPS)]))
+        if duty_trips[d]:
+            cp_model.add(span(duties[d],
+                              [trip2duty[(t, d)] for t in duty_trips[d]]))
+        else:
+            cp_model.add(presence_of(duties[d]) == 0)
 
     for d in range(NDUTIES):
-        cp_model.add(no_overlap([trip2duty[(t, d)] for t in range(NTRIPS)]))
+        cp_model.add(no_overlap([trip2duty[(t, d)] for t in duty_trips[d]]))
 
     for t in range(NTRIPS):
         trip_coverage = cp_model.sum([presence_of(trip2duty[(t, d)])
-                                      for d in range(NDUTIES)])
+                                      for d in domains[t]])
         cp_model.add(trip_coverage == 1)
 
     for d in range(NDUTIES):
         duty_driving_time = cp_model.sum([model.durations[t] * presence_of(trip2duty[(t, d)])
-                                          for t in range(NTRIPS)])
+                                          for t in duty_trips[d]])
         cp_model.add(duty_driving_time <= model.constraints.total_driving)
 
-    for d in range(NDUTIES):
-        for t1 in range(NTRIPS):
-            for t2 in range(NTRIPS):
-                if model.start_times[t2] >= model.end_times[t1]:
-                    next_trips = []
-                    for t3 in range(NTRIPS):
-                        if model.start_times[t3] >= model.end_times[t1] and model.end_times[t3] <= model.start_times[t2]:
-                            next_trips.append(t3)
-                    cp_model.add(
-                        if_then(
-                            logical_and([presence_of(trip2duty[(t1, d)]),
-                                         presence_of(trip2duty[(t2, d)]),
-                                         (sum([presence_of(trip2duty[(t3, d)]) for t3 in next_trips]) == 0)]),
-                            (model.start_locs[t2] == model.end_locs[t1]))
-                    )
+    presence = {key: presence_of(var) for key, var in trip2duty.items()}
+
+    for t1, t2, between in model.deadhead_pairs():
+        shared = range(max(domains[t1].start, domains[t2].start),
+                       min(domains[t1].stop, domains[t2].stop))
+        for d in shared:
+            in_between = [presence[(t3, d)] for t3 in between if d in domains[t3]]
+            if in_between:
+                cp_model.add(
+                    if_then(
+                        logical_and(presence[(t1, d)], presence[(t2, d)]),
+                        cp_model.sum(in_between) > 0)
+                )
+            else:
+                cp_model.add(presence[(t1, d)] + presence[(t2, d)] <= 1)
 
     # If the model is to be solved considering breaks then
     # the following variables and constraints are added
     if add_breaks:
-        breaks = [interval_var(size=model.constraints.break_time,
-                               name=f"BreakTime_{i}",
-                               optional=True)
-                  for i in range(NDUTIES)]
-
-        end_dt = []
-        for t in range(NTRIPS):
-            end_dt.append([integer_var(min=0,
-                                       max=model.constraints.shift_span,
-                                       name=f"EDT_{t:02}_{d:02}") for d in range(NDUTIES)])
-
-        for t in range(NTRIPS):
-            previous_trips = []
-            for b in range(NTRIPS):
-                if model.end_times[b] <= model.start_times[t]:
-                    previous_trips.append(b)
-            for d in range(NDUTIES):
-                trips_duration = sum([model.durations[b] * presence_of(trip2duty[(b, d)])
-                                     for b in previous_trips]) + (model.durations[t])
-                cp_model.add(end_dt[t][d] == trips_duration)
-
-        for t in range(NTRIPS):
-            for d in range(NDUTIES):
-                cp_model.add(
-                    if_then(
-                        logical_and((end_dt[t][d] <= model.constraints.continuous_driving),
-                                    (presence_of(trip2duty[(t, d)]))),
-                        (end_of(trip2duty[(t, d)]) <= start_of(breaks[d]))))
-                cp_model.add(
-                    if_then(
-                        logical_and((end_dt[t][d] > model.constraints.continuous_driving),
-                                    (presence_of(trip2duty[(t, d)]))),
-                        (start_of(trip2duty[(t, d)]) >= end_of(breaks[d]))))
+        breaks = add_breaks_model(cp_model=cp_model,
+                                  model=model,
+                                  duties=duties,
+                                  trip2duty=trip2duty,
+                                  duty_trips=duty_trips)
 
     # If the model is to be solved considering vehicle limit then
     # the following variable and constraint are added
     if nbuses is not None:
         bus_usage = step_at(0, 0)
         for t in range(NTRIPS):
-            for d in range(NDUTIES):
+            for d in domains[t]:
                 bus_usage += pulse(trip2duty[(t, d)], 1)
 
         cp_model.add(bus_usage <= nbuses)
@@ -141,6 +120,7 @@ def multiple_depot_CSP(model: CSPModel,
         'nduties': NDUTIES,
         'duties': duties,
         'trip2duty': trip2duty,
+        'duty_trips': duty_trips,
         'breaks': breaks,
         'nbuses': nbuses,
         'min_start': model.min_start,
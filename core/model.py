@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 from typing import Optional
 
+from atopt.core.breaks import add_breaks_model
+from atopt.core.listener import StopCriteria
 from atopt.core.plot import log_and_plot
+from atopt.core.profiler import BuildProfiler
 from atopt.core.initial import Insertions
-from atopt.utilities import CSPModel, DataProvider
+from atopt.utilities import CSPModel, DataProvider, check_feasibility
 from docplex.cp.model import *
 
 
@@ -13,17 +16,18 @@ def BusDriverCSP(model: CSPModel,
                  add_breaks: Optional[bool] = True,
                  nbuses: Optional[int] = None,
                  objective: Optional[bool] = True,
-                 ub: Optional[int] = None) -> CpoModel:
+                 ub: Optional[int] = None,
+                 symmetry_breaking: Optional[bool] = False,
+                 stop_gap: Optional[float] = None,
+                 stall_time: Optional[float] = None,
+                 target: Optional[int] = None,
+                 lower_bound: Optional[float] = None,
+                 profile: Optional[bool] = False) -> CpoModel:
 
-    if nbuses is not None and nbuses < model.minimum_buses:
-        raise ValueError(
-            f"Model can't be solved with less than {model.minimum_buses} vehicles")
-
-    if nduties is not None and nduties < model.minimum_duties:
-        raise ValueError(
-            f"Model can't be solved with less than {model.minimum_duties} duties")
+    check_feasibility(model, nduties=nduties, nbuses=nbuses, add_breaks=add_breaks)
 
     cp_model = CpoModel(name="Bus Driver Crew Scheduling Problem Model")
+    profiler = BuildProfiler(cp_model, enabled=profile)
 
     NDUTIES = nduties
 
@@ -34,115 +38,133 @@ def BusDriverCSP(model: CSPModel,
 
     breaks = None
 
-    duties = [interval_var(start=(model.min_start, model.max_start),
-                           end=(model.min_end, model.max_end),
-                           size=(0, model.constraints.shift_span),
-                           name=f"Duty_{i}",
-                           optional=True)
-              for i in range(NDUTIES)]
+    with profiler.section('variables'):
+        duties = [interval_var(start=(model.min_start, model.max_start),
+                               end=(model.min_end, model.max_end),
+                               size=(0, model.constraints.shift_span),
+                               name=f"Duty_{i}",
+                               optional=True)
+                  for i in range(NDUTIES)]
+
+        domains = model.duty_domains(NDUTIES)
+
+        trip2duty = {}
+        duty_trips = [[] for _ in range(NDUTIES)]
+        # A trip can stand for a chain of trips merged by the presolve,
+        # which drives for its duration but runs from start to end
+        for t, trip in enumerate(model.trips):
+            for d in domains[t]:
+                if t < NTRIPS:
+                    duty_trips[d].append(t)
+                trip2duty[(t, d)] = interval_var(start=(trip.start_time, trip.start_time),
+                                                 end=(trip.end_time, trip.end_time),
+                                                 size=trip.end_time - trip.start_time,
+                                                 name=f"Trip_{t:02} | Duty_{d:02}",
+                                                 optional=True)
+
+        profiler.created(duties)
+        profiler.created(trip2duty.values())
+
+    with profiler.section('span'):
+        for d in range(NDUTIES):
+            if duty_trips[d]:
+                cp_model.add(span(duties[d],
+                                  [trip2duty[(t, d)] for t in duty_trips[d]]))
+            else:
+                cp_model.add(presence_of(duties[d]) == 0)
 
-    trip2duty = {}
-    for t, trip in enumerate(model.trips):
+    with profiler.section('no_overlap'):
         for d in range(NDUTIES):
-            trip2duty[(t, d)] = interval_var(start=(trip.start_time, trip.start_time),
-                                             end=(trip.end_time, trip.end_time),
-                                             size=trip.duration,
-                                             name=f"Trip_{t:02} | Duty_{d:02}",
-                                             optional=True)
-
-    for d in range(NDUTIES):
-        cp_model.add(span(duties[d],
-                          [trip2duty[(t, d)] for t in range(NTRIPS)]))
-
-    for d in range(NDUTIES):
-        duty_intervals = [trip2duty[(t, d)] for t in range(NTRIPS)]
-        cp_model.add(no_overlap(duty_intervals))
-
-    for t in range(NTRIPS):
-        trip_coverage = cp_model.sum([presence_of(trip2duty[(t, d)])
-                                      for d in range(NDUTIES)])
-        cp_model.add(trip_coverage == 1)
-
-    for d in range(NDUTIES):
-        duty_driving_time = cp_model.sum([model.durations[t] * presence_of(trip2duty[(t, d)])
-                                          for t in range(NTRIPS)])
-        cp_model.add(duty_driving_time <= model.constraints.total_driving)
+            duty_intervals = [trip2duty[(t, d)] for t in duty_trips[d]]
+            cp_model.add(no_overlap(duty_intervals))
 
-    if model.depot_type == "Multiple Depot":
+    with profiler.section('coverage'):
+        for t in range(NTRIPS):
+            trip_coverage = cp_model.sum([presence_of(trip2duty[(t, d)])
+                                          for d in domains[t]])
+            cp_model.add(trip_coverage == 1)
+
+    with profiler.section('driving'):
         for d in range(NDUTIES):
-            for t1 in range(NTRIPS):
-                for t2 in range(NTRIPS):
-                    if model.start_times[t2] >= model.end_times[t1]:
-                        next_trips = []
-                        for t3 in range(NTRIPS):
-                            if model.start_times[t3] >= model.end_times[t1] and model.end_times[t3] <= model.start_times[t2]:
-                                next_trips.append(t3)
+            duty_driving_time = cp_model.sum([model.durations[t] * presence_of(trip2duty[(t, d)])
+                                              for t in duty_trips[d]])
+            cp_model.add(duty_driving_time <= model.constraints.total_driving)
+
+    if model.depot_type == "Multiple Depot":
+        with profiler.section('deadhead'):
+            presence = {key: presence_of(var) for key, var in trip2duty.items()}
+
+            for t1, t2, between in model.deadhead_pairs():
+                shared = range(max(domains[t1].start, domains[t2].start),
+                               min(domains[t1].stop, domains[t2].stop))
+                for d in shared:
+                    in_between = [presence[(t3, d)] for t3 in between if d in domains[t3]]
+                    if in_between:
                         cp_model.add(
                             if_then(
-                                logical_and([presence_of(trip2duty[(t1, d)]),
-                                             presence_of(trip2duty[(t2, d)]),
-                                             (sum([presence_of(trip2duty[(t3, d)]) for t3 in next_trips]) == 0)]),
-                                (model.start_locs[t2] == model.end_locs[t1]))
+                                logical_and(presence[(t1, d)], presence[(t2, d)]),
+                                cp_model.sum(in_between) > 0)
                         )
+                    else:
+                        cp_model.add(presence[(t1, d)] + presence[(t2, d)] <= 1)
 
     # If the model is to be solved considering breaks then
     # the following variables and constraints are added
     if add_breaks:
-        breaks = [interval_var(size=model.constraints.break_time,
-                               name=f"BreakTime_{i}",
-                               optional=True)
-                  for i in range(NDUTIES)]
-
-        end_dt = []
-        for t in range(NTRIPS):
-            end_dt.append([integer_var(min=0,
-                                       max=model.constraints.shift_span,
-                                       name=f"EDT_{t:02}_{d:02}") for d in range(NDUTIES)])
-
-        for t in range(NTRIPS):
-            previous_trips = []
-            for b in range(NTRIPS):
-                if model.end_times[b] <= model.start_times[t]:
-                    previous_trips.append(b)
-            for d in range(NDUTIES):
-                trips_duration = sum([model.durations[b] * presence_of(trip2duty[(b, d)])
-                                     for b in previous_trips]) + (model.durations[t])
-                cp_model.add(end_dt[t][d] == trips_duration)
-
-        for t in range(NTRIPS):
-            for d in range(NDUTIES):
+        with profiler.section('breaks'):
+            breaks = add_breaks_model(cp_model=cp_model,
+                                      model=model,
+                                      duties=duties,
+                                      trip2duty=trip2duty,
+                                      duty_trips=duty_trips)
+
+    # If the model is to be solved with symmetry breaking then
+    # duties are used in order, open in order of their start time
+    # and the earliest trip is always assigned to the first duty
+    if symmetry_breaking:
+        with profiler.section('symmetry'):
+            for d in range(1, NDUTIES):
+                cp_model.add(presence_of(duties[d]) <= presence_of(duties[d - 1]))
                 cp_model.add(
-                    if_then(
-                        logical_and((end_dt[t][d] <= model.constraints.continuous_driving),
-                                    (presence_of(trip2duty[(t, d)]))),
-                        (end_of(trip2duty[(t, d)]) <= start_of(breaks[d]))))
-                cp_model.add(
-                    if_then(
-                        logical_and((end_dt[t][d] > model.constraints.continuous_driving),
-                                    (presence_of(trip2duty[(t, d)]))),
-                        (start_of(trip2duty[(t, d)]) >= end_of(breaks[d]))))
+                    if_then(presence_of(duties[d]),
+                            start_of(duties[d - 1]) <= start_of(duties[d])))
+
+            cp_model.add(presence_of(trip2duty[(0, 0)]) == 1)
 
     # If the model is to be solved considering vehicle limit then
     # the following variable and constraint are added
     if nbuses is not None:
-        bus_usage = step_at(0, 0)
-        for t in range(NTRIPS):
-            for d in range(NDUTIES):
-                bus_usage += pulse(trip2duty[(t, d)], 1)
+        with profiler.section('bus_usage'):
+            bus_usage = step_at(0, 0)
+            for t in range(NTRIPS):
+                for d in domains[t]:
+                    bus_usage += pulse(trip2duty[(t, d)], 1)
 
-        cp_model.add(bus_usage <= nbuses)
+            cp_model.add(bus_usage <= nbuses)
 
     # If the model is to be solved as a constraint optimization problem
     # instead of constraint satisfaction problem then
     # the following obective is added
     if objective:
-        obj = cp_model.sum([presence_of(duty) for duty in duties])
-        cp_model.add(obj >= model.minimum_duties)
-
-        if ub is not None:
-            cp_model.add(obj <= ub)
-
-        cp_model.add(cp_model.minimize(obj))
+        with profiler.section('objective'):
+            obj = cp_model.sum([presence_of(duty) for duty in duties])
+            cp_model.add(obj >= model.minimum_duties)
+
+            if ub is not None:
+                cp_model.add(obj <= ub)
+
+            cp_model.add(cp_model.minimize(obj))
+
+    # If the solve is to be stopped before the time limit then
+    # the following solver listener is added
+    if any(x is not None for x in [stop_gap, stall_time, target]):
+        stop = StopCriteria(lower_bound=model.minimum_duties if lower_bound is None else lower_bound,
+                            gap=stop_gap,
+                            stall_time=stall_time,
+                            target=target)
+        cp_model.add_solver_listener(stop)
+    else:
+        stop = None
 
     model_info = {
         'model': model,
@@ -150,8 +172,11 @@ def BusDriverCSP(model: CSPModel,
         'nduties': NDUTIES,
         'duties': duties,
         'trip2duty': trip2duty,
+        'duty_trips': duty_trips,
         'breaks': breaks,
         'nbuses': nbuses,
+        'stop': stop,
+        'profile': profiler.report(),
         'min_start': model.min_start,
         'max_end': model.max_end
     }
@@ -8,12 +8,16 @@ import matplotlib.pyplot as plt
 from docplex.cp.model import *
 from pylab import rcParams
 
+from atopt.utilities import CSPModel, Solution, SolutionValidator
+
 
 def log_and_plot(sol: CpoSolveResult,
                  model_info: dict,
                  save_folder: Union[str, Path],
                  has_breaks: Optional[bool] = True,
-                 has_traffic: Optional[bool] = True):
+                 has_traffic: Optional[bool] = True,
+                 show: Optional[bool] = True,
+                 verbose: Optional[bool] = True):
     rcParams['figure.figsize'] = 12, 8
 
     model = model_info.get('model')
@@ -25,12 +29,28 @@ def log_and_plot(sol: CpoSolveResult,
     nbuses = model_info.get('nbuses')
     min_start = model_info.get('min_start')
     max_end = model_info.get('max_end')
+    presolve = model_info.get('presolve')
+
+    # A presolved model is reported on the trips of the route. Each of its
+    # trips is a piece of one or more route trips, and the trips left out
+    # run as duties of their own after the solved ones
+    if presolve is not None:
+        model = presolve.original
+        pieces = presolve.pieces
+        singletons = presolve.singletons
+        min_start = model.min_start
+        max_end = model.max_end
+    else:
+        pieces = None
+        singletons = []
 
     status = sol.get_solve_status()
+    if presolve is not None:
+        status = presolve.status(status)
 
     save_loc = Path(save_folder)
 
-    total_duties = 0
+    total_duties = len(singletons)
 
     try:
         for d in range(nduties):
@@ -45,40 +65,90 @@ def log_and_plot(sol: CpoSolveResult,
         sol_excel = save_loc.joinpath(
             f"{date_str}-S-{status}-{total_duties}-[Breaks={bool(breaks)}-Traffic={has_traffic}-Buses={nbuses}].xlsx")
 
-        sol.print_solution()
+        if verbose:
+            sol.print_solution()
 
         buses = CpoStepFunction()
 
-        model.data['duty'] = ''
+        model.data['duty'] = None
 
         with open(sol_log, 'w') as sol_log_file:
             driving_times = []
             for d in range(nduties):
                 if sol[duties[d]]:
-                    print(f"\n> Duty {d} : {sol[duties[d]]}")
+                    if verbose:
+                        print(f"\n> Duty {d} : {sol[duties[d]]}")
                     sol_log_file.write(f"\n> Duty {d} : {sol[duties[d]]}")
                     _tdt = 0
                     _ntrips = 0
                     for t in range(ntrips):
-                        if sol[trip2duty[(t, d)]]:
-                            model.data.loc[t, 'duty'] = d
-                            bus_td = sol.get_var_solution(trip2duty[(t, d)])
-                            buses.add_value(bus_td.get_start(), bus_td.get_end(), 1)
-                            print(f"  - Trip {t} : {sol[trip2duty[(t, d)]]}")
-                            sol_log_file.write(
-                                f"\n  - Trip {t} : {sol[trip2duty[(t, d)]]}")
-                            _tdt += model.durations[t]
-                            _ntrips += 1
-                    print(f"\n  > Driving Time: {_tdt}, Trips: {_ntrips}")
+                        if (t, d) in trip2duty and sol[trip2duty[(t, d)]]:
+                            if pieces is None:
+                                model.data.loc[t, 'duty'] = d
+                                bus_td = sol.get_var_solution(trip2duty[(t, d)])
+                                buses.add_value(bus_td.get_start(), bus_td.get_end(), 1)
+                                if verbose:
+                                    print(f"  - Trip {t} : {sol[trip2duty[(t, d)]]}")
+                                sol_log_file.write(
+                                    f"\n  - Trip {t} : {sol[trip2duty[(t, d)]]}")
+                                _tdt += model.durations[t]
+                                _ntrips += 1
+                                continue
+
+                            for o in pieces[t]:
+                                model.data.loc[o, 'duty'] = d
+                                buses.add_value(model.start_times[o], model.end_times[o], 1)
+                                if verbose:
+                                    print(f"  - Trip {o} : {model.start_times[o]}-{model.end_times[o]}")
+                                sol_log_file.write(
+                                    f"\n  - Trip {o} : {model.start_times[o]}-{model.end_times[o]}")
+                                _tdt += model.durations[o]
+                                _ntrips += 1
+                    if verbose:
+                        print(f"\n  > Driving Time: {_tdt}, Trips: {_ntrips}")
                     sol_log_file.write(
                         f"\n  > Driving Time: {_tdt}, Trips: {_ntrips}\n")
                     driving_times.append(_tdt)
                 else:
                     driving_times.append(0)
 
+            for d, o in enumerate(singletons, start=nduties):
+                model.data.loc[o, 'duty'] = d
+                buses.add_value(model.start_times[o], model.end_times[o], 1)
+                if verbose:
+                    print(f"\n> Duty {d} : {model.start_times[o]}-{model.end_times[o]}")
+                    print(f"  - Trip {o} : {model.start_times[o]}-{model.end_times[o]}")
+                sol_log_file.write(f"\n> Duty {d} : {model.start_times[o]}-{model.end_times[o]}")
+                sol_log_file.write(f"\n  - Trip {o} : {model.start_times[o]}-{model.end_times[o]}")
+                sol_log_file.write(
+                    f"\n  > Driving Time: {model.durations[o]}, Trips: 1\n")
+
         model.data.to_excel(sol_excel)
         sol.write(str(out))
 
+        # The trips the model left out of the solve aren't checked
+        checked = len(model.durations) if pieces is not None else ntrips
+        validator = SolutionValidator(model.start_times[:checked],
+                                      model.end_times[:checked],
+                                      model.start_locs[:checked],
+                                      model.end_locs[:checked],
+                                      model.durations[:checked],
+                                      model.constraints,
+                                      check_breaks=has_breaks)
+        assignment = model.data['duty'].iloc[:checked].fillna(-1).to_numpy(dtype=int)
+        validation = validator.report(validator.violations(assignment))
+        if verbose:
+            if presolve is not None:
+                print(f"\nRoute status: {status}")
+            print(f"\n{validation}")
+
+        with open(out, 'a') as report_file:
+            if presolve is not None:
+                report_file.write(f"\nPresolve: {presolve.summary()}\nRoute status: {status}\n")
+            report_file.write(f"\n{validation}\n")
+            if model_info.get('profile'):
+                report_file.write(f"\n{model_info['profile']}\n")
+
         visu.timeline(f"{date_str}-F-{status}-{total_duties}-[Breaks={bool(breaks)}-Traffic={has_traffic}-Buses={nbuses}]",
                     origin=min_start,
                     horizon=max_end)
@@ -87,13 +157,75 @@ def log_and_plot(sol: CpoSolveResult,
             if sol[duties[d]]:
                 visu.panel()
                 visu.sequence(name=f"{duties[d].get_name()} ({driving_times[d]})",
-                            intervals=[(sol.get_var_solution(trip2duty[(t, d)]), d, str(t)) for t in range(ntrips) if sol[trip2duty[(t, d)]]])
+                            intervals=[(sol.get_var_solution(trip2duty[(t, d)]), d, str(t) if pieces is None else '+'.join(map(str, pieces[t]))) for t in range(ntrips) if (t, d) in trip2duty and sol[trip2duty[(t, d)]]])
                 if has_breaks:
                     visu.interval(sol.get_var_solution(breaks[d]), 'red', 'B')
 
         visu.panel(name="Buses")
         visu.function(segments=buses, style='area')
 
-        visu.show()
+        if show:
+            visu.show()
+        else:
+            figure = save_loc.joinpath(
+                f"{date_str}-F-{status}-{total_duties}-[Breaks={bool(breaks)}-Traffic={has_traffic}-Buses={nbuses}].png")
+            visu.show(pngfile=str(figure))
+            plt.close('all')
     except KeyError as e:
         print(f" -- NO SOLUTION -- [KeyError: {e}]")
+
+
+def log_solution(sol: Solution,
+                 model: CSPModel,
+                 save_folder: Union[str, Path],
+                 status: str,
+                 report: str = "",
+                 has_breaks: Optional[bool] = True,
+                 has_traffic: Optional[bool] = True,
+                 verbose: Optional[bool] = True) -> Path:
+    # Writes a solution built outside CP Optimizer to the same -R- and -S-
+    # files as log_and_plot
+    duties = [duty for duty in sol.duties if duty.trips]
+    total_duties = len(duties)
+
+    save_loc = Path(save_folder)
+
+    date_str = datetime.now().strftime('[%Y-%m-%d %H-%M]')
+    out = save_loc.joinpath(
+        f"{date_str}-R-{status}-{total_duties}-[Breaks={has_breaks}-Traffic={has_traffic}-Buses=None].txt")
+    sol_log = save_loc.joinpath(
+        f"{date_str}-S-{status}-{total_duties}-[Breaks={has_breaks}-Traffic={has_traffic}-Buses=None].txt")
+    sol_excel = save_loc.joinpath(
+        f"{date_str}-S-{status}-{total_duties}-[Breaks={has_breaks}-Traffic={has_traffic}-Buses=None].xlsx")
+
+    model.data['duty'] = None
+
+    with open(sol_log, 'w') as sol_log_file:
+        for duty in duties:
+            if verbose:
+                print(f"\n> Duty {duty.ID} : {duty.start_time}-{duty.end_time}")
+            sol_log_file.write(f"\n> Duty {duty.ID} : {duty.start_time}-{duty.end_time}")
+
+            for trip in duty.trips:
+                model.data.loc[trip.ID, 'duty'] = duty.ID
+                if verbose:
+                    print(f"  - Trip {trip.ID} : {trip.start_time}-{trip.end_time}")
+                sol_log_file.write(f"\n  - Trip {trip.ID} : {trip.start_time}-{trip.end_time}")
+
+            if verbose:
+                print(f"\n  > Driving Time: {duty.driving_time}, Trips: {len(duty.trips)}")
+            sol_log_file.write(
+                f"\n  > Driving Time: {duty.driving_time}, Trips: {len(duty.trips)}\n")
+
+    model.data.to_excel(sol_excel)
+
+    validation = SolutionValidator.report(sol.validate(check_breaks=has_breaks))
+    if verbose:
+        print(f"\n{validation}")
+
+    with open(out, 'w') as report_file:
+        report_file.write(f"Status: {status}\nDuties: {total_duties}\n\n{validation}\n")
+        if report:
+            report_file.write(f"\n{report}\n")
+
+    return out
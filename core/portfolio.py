@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Union
+
+from docplex.cp.model import CpoModel
+from docplex.cp.solution import CpoModelSolution, CpoSolveResult
+from docplex.cp.solver.solver_listener import CpoSolverListener
+
+from atopt.core.listener import IncumbentLogger
+
+# Each configuration holds CP Optimizer parameters, plus whether
+# the model of that member is built with symmetry breaking
+default_portfolio = [
+    {'SearchType': 'Restart', 'RandomSeed': 1, 'symmetry_breaking': False},
+    {'SearchType': 'Restart', 'RandomSeed': 2, 'symmetry_breaking': True},
+    {'SearchType': 'MultiPoint', 'RandomSeed': 3, 'symmetry_breaking': False},
+    {'SearchType': 'MultiPoint', 'RandomSeed': 4, 'symmetry_breaking': True},
+]
+
+
+def portfolio_configs(nmembers: int) -> List[dict]:
+    # Cycles through the default configurations, every member
+    # with its own random seed
+    return [{**default_portfolio[i % len(default_portfolio)], 'RandomSeed': i + 1}
+            for i in range(nmembers)]
+
+
+class PortfolioState:
+    # Best objective and bound over all members. As soon as some member's
+    # solution meets the best bound proved by any member, it is optimal
+    # and every solve is aborted
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.solvers = []
+        self.objective = None
+        self.bound = None
+        self.stopped = False
+
+    def register(self, solver) -> None:
+        # A member that starts after the others were aborted stops at once
+        with self.lock:
+            self.solvers.append(solver)
+            stopped = self.stopped
+
+        if stopped:
+            solver.abort_search()
+
+    def update(self, sres: CpoSolveResult) -> None:
+        objective = sres.get_objective_values()
+        bounds = sres.get_objective_bounds()
+
+        with self.lock:
+            if objective:
+                self.objective = objective[0] if self.objective is None else min(self.objective, objective[0])
+            if bounds:
+                self.bound = bounds[0] if self.bound is None else max(self.bound, bounds[0])
+
+            is_closed = self.objective is not None and self.bound is not None and self.objective <= self.bound
+            if self.stopped or not (is_closed or sres.is_solution_optimal()):
+                return
+
+            self.stopped = True
+            solvers = list(self.solvers)
+
+        for solver in solvers:
+            solver.abort_search()
+
+
+class PortfolioMember(CpoSolverListener):
+    def __init__(self, state: PortfolioState) -> None:
+        super().__init__()
+        self.state = state
+
+    def solver_created(self, solver):
+        solver.context.solver.solve_with_search_next = True
+        self.state.register(solver)
+
+    def result_found(self, solver, sres: CpoSolveResult):
+        if sres.is_solution():
+            self.state.update(sres)
+
+
+def solve_portfolio(build: Callable[[bool], Tuple[CpoModel, dict]],
+                    configs: Optional[List[dict]] = None,
+                    time_limit: Optional[float] = None,
+                    workers: Optional[int] = None,
+                    starting_point: Optional[Callable[[dict], CpoModelSolution]] = None,
+                    save_folder: Optional[Union[str, Path]] = None) -> Tuple[CpoSolveResult, dict]:
+    # The members are built one after the other, since building is bound
+    # to the interpreter, and then solved together: every solve runs in its
+    # own CP Optimizer process, so the threads only wait on them.
+    # The total number of workers is split evenly between the members
+    configs = default_portfolio if configs is None else configs
+    if workers is None:
+        workers = os.cpu_count() or 1
+    member_workers = max(1, workers // len(configs))
+
+    state = PortfolioState()
+    members = []
+
+    for i, config in enumerate(configs):
+        params = {k: v for k, v in config.items() if k != 'symmetry_breaking'}
+        cp_model, model_info = build(config.get('symmetry_breaking', False))
+
+        if starting_point is not None:
+            cp_model.set_starting_point(starting_point(model_info))
+
+        cp_model.add_solver_listener(PortfolioMember(state))
+
+        if save_folder is not None:
+            date_str = datetime.now().strftime('[%Y-%m-%d %H-%M]')
+            incumbents = Path(save_folder).joinpath(f"{date_str}-I-Portfolio-{i}.jsonl")
+            cp_model.add_solver_listener(IncumbentLogger(model_info, incumbents))
+
+        members.append((cp_model, model_info, params))
+
+    def _solve(member):
+        cp_model, _, params = member
+        return cp_model.solve(TimeLimit=time_limit,
+                              Workers=member_workers,
+                              LogVerbosity='Quiet',
+                              **params)
+
+    with ThreadPoolExecutor(max_workers=len(members)) as pool:
+        results = list(pool.map(_solve, members))
+
+    print("\n-- Portfolio --\n")
+    for config, sres in zip(configs, results):
+        objective = sres.get_objective_values() if sres.is_solution() else None
+        print(f"{config}: {sres.get_solve_status()}, objective {objective}, {sres.get_solve_time():.2f}s")
+
+    # The best member is the one with the lowest objective,
+    # ties going to a proved optimum and then to the faster solve
+    solved = [i for i, sres in enumerate(results) if sres.is_solution()]
+    if not solved:
+        return results[0], members[0][1]
+
+    best = min(solved, key=lambda i: ((results[i].get_objective_values() or [0])[0],
+                                      not results[i].is_solution_optimal(),
+                                      results[i].get_solve_time()))
+
+    return results[best], members[best][1]
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import time as timer
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List
+
+import pandas as pd
+from docplex.cp.model import CpoModel
+
+profile_columns = ['family', 'time', 'peak_mb', 'variables', 'constraints', 'nodes']
+
+
+class BuildProfiler:
+    # Measures the wall time and the peak traced memory of each block of
+    # the model builder, and counts what the block added to the model:
+    # constraints, variables and expression nodes. Variables are counted
+    # in the block that creates them when it reports them, otherwise in the
+    # first block that uses them, and shared expressions are counted once.
+    # Tracing memory slows the build down several times, so a disabled
+    # profiler only runs the blocks
+    def __init__(self, cp_model: CpoModel, enabled: bool = True) -> None:
+        self.cp_model = cp_model
+        self.enabled = enabled
+        self.sections: List[dict] = []
+        self._seen = set()
+        self._current = None
+
+    @contextmanager
+    def section(self, family: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        memory = tracemalloc.get_traced_memory()[0]
+        first = len(self.cp_model.get_all_expressions())
+        self._current = {'family': family, 'variables': 0}
+
+        started = timer.perf_counter()
+        yield
+        elapsed = timer.perf_counter() - started
+
+        peak = tracemalloc.get_traced_memory()[1] - memory
+        if started_tracing:
+            tracemalloc.stop()
+
+        added = self.cp_model.get_all_expressions()[first:]
+        variables, nodes = self._walk([expr for expr, _ in added])
+
+        self._current.update({'time': elapsed,
+                              'peak_mb': peak / 2 ** 20,
+                              'variables': self._current['variables'] + variables,
+                              'constraints': len(added),
+                              'nodes': nodes})
+        self.sections.append(self._current)
+        self._current = None
+
+    def created(self, variables: Iterable) -> None:
+        # Marks variables as created by the running block,
+        # even if the model only refers to them later
+        if not self.enabled or self._current is None:
+            return
+
+        for var in variables:
+            if id(var) not in self._seen:
+                self._seen.add(id(var))
+                self._current['variables'] += 1
+
+    def _walk(self, exprs: list) -> tuple:
+        variables = 0
+        nodes = 0
+
+        stack = list(exprs)
+        while stack:
+            expr = stack.pop()
+            if id(expr) in self._seen:
+                continue
+
+            self._seen.add(id(expr))
+            nodes += 1
+            if expr.type.is_variable:
+                variables += 1
+            stack.extend(expr.children)
+
+        return variables, nodes
+
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame(self.sections, columns=profile_columns)
+        total = frame[profile_columns[1:]].sum()
+        total['peak_mb'] = frame['peak_mb'].max()
+        frame.loc[len(frame)] = ['total', *total.to_list()]
+
+        return frame.round({'time': 3, 'peak_mb': 2}).astype(
+            {'variables': int, 'constraints': int, 'nodes': int})
+
+    def report(self) -> str:
+        if not self.sections:
+            return ""
+
+        return "-- Model Build Profile --\n\n" + self.to_frame().to_string(index=False)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+from dataclasses import replace
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from docplex.cp.model import presence_of
+
+from atopt.config import traffic_timeslots
+from atopt.core.initial import Insertions, build_duties
+from atopt.core.model import BusDriverCSP
+from atopt.utilities import *
+
+
+def traffic_boundaries() -> List[int]:
+    # The minutes where the traffic level of config.traffic_timeslots changes
+    return sorted({start for start, _ in traffic_timeslots})
+
+
+class RollingHorizon:
+    # Solves the day one window at a time. A window model holds the trips
+    # starting in the window, the trips of the overlap after it, and every
+    # trip of the duties still open from earlier windows, fixed to its duty.
+    # Those duties then keep their driving time, break and shift span exactly
+    # as they were, without carrying any state outside the model. Only trips
+    # starting before the next boundary are committed, the overlap is solved
+    # again with the next window. Duties that can't take another trip are
+    # closed and left out of the later windows
+    def __init__(self,
+                 model: CSPModel,
+                 boundaries: Optional[Sequence[int]] = None,
+                 overlap: int = 60,
+                 time_limit: Optional[float] = None,
+                 add_breaks: bool = True,
+                 symmetry_breaking: bool = False,
+                 stop_gap: Optional[float] = None,
+                 stall_time: Optional[float] = None) -> None:
+        self.model = model
+        self.constraints = model.constraints
+        self.trips = [replace(trip) for trip in model.trips]
+        self.overlap = overlap
+        self.time_limit = time_limit
+        self.add_breaks = add_breaks
+        self.symmetry_breaking = symmetry_breaking
+        self.stop_gap = stop_gap
+        self.stall_time = stall_time
+
+        if boundaries is None:
+            boundaries = traffic_boundaries()
+
+        # The last window ends after the last trip, so it commits the rest
+        self.cuts = sorted({b for b in boundaries
+                            if model.min_start < b <= model.max_start})
+        self.cuts.append(model.max_start + 1)
+
+        self.windows: List[dict] = []
+        self.duties: List[Duty] = []
+        self.status = None
+        self.sol = None
+
+    def _is_open(self, duty: List[int], cut: int) -> bool:
+        # Trips from the next window start at cut or later
+        m = self.model
+        c = self.constraints
+
+        span_left = m.start_times[duty[0]] + c.shift_span - cut
+        driving = m.durations[duty].sum()
+
+        return span_left >= m.min_trip_duration and driving + m.min_trip_duration <= c.total_driving
+
+    def _solve_window(self, open_duties: List[List[int]], new: np.ndarray) -> Tuple[List[List[int]], dict]:
+        carried = [t for duty in open_duties for t in duty]
+        positions = np.sort(np.concatenate([np.asarray(carried, dtype=np.int64), new]))
+        local = {t: k for k, t in enumerate(positions.tolist())}
+
+        window = self.model.subset(positions)
+
+        # New trips always fit in the duties the heuristic opens for them
+        # alone, so that many duties on top of the open ones is feasible
+        initial = Insertions(self.model.subset(new))
+        initial.solve()
+        nduties = len(open_duties) + len(initial.duties)
+
+        cp_model, model_info = BusDriverCSP(model=window,
+                                            nduties=nduties,
+                                            add_breaks=self.add_breaks,
+                                            ub=nduties,
+                                            symmetry_breaking=self.symmetry_breaking,
+                                            stop_gap=self.stop_gap,
+                                            stall_time=self.stall_time)
+
+        # Open duties are numbered in the order of their first trip, which
+        # comes before every new trip, so they match the duty domains
+        trip2duty = model_info['trip2duty']
+        for d, duty in enumerate(open_duties):
+            for t in duty:
+                cp_model.add(presence_of(trip2duty[(local[t], d)]) == 1)
+
+        cpsol = cp_model.solve(TimeLimit=self.time_limit,
+                               LogVerbosity='Quiet')
+
+        info = {'trips': len(new),
+                'carried': len(carried),
+                'nduties': nduties,
+                'status': cpsol.get_solve_status(),
+                'solve_time': round(cpsol.get_solve_time(), 2)}
+
+        if cpsol.is_solution():
+            duties = [[] for _ in range(nduties)]
+            for (k, d), var in trip2duty.items():
+                if cpsol[var]:
+                    duties[d].append(int(positions[k]))
+            duties = [sorted(duty) for duty in duties if duty]
+        else:
+            # Without a solution the open duties stay as they are and
+            # the new trips take the heuristic duties
+            ids = {trip.ID: t for t, trip in zip(new.tolist(), initial.trips)}
+            duties = open_duties + [[ids[trip.ID] for trip in duty.trips]
+                                    for duty in initial.duties if duty.trips]
+
+        return duties, info
+
+    def solve(self):
+        start_times = self.model.start_times
+        open_duties: List[List[int]] = []
+        closed: List[List[int]] = []
+        begin = self.model.min_start
+
+        for cut in self.cuts:
+            new = np.flatnonzero((start_times >= begin) & (start_times < cut + self.overlap))
+
+            # Nothing to commit, the trips of the overlap wait for the next window
+            if not (start_times[new] < cut).any():
+                continue
+
+            duties, info = self._solve_window(open_duties, new)
+            info['window'] = (int(begin), int(cut))
+            self.windows.append(info)
+
+            open_duties = []
+            for duty in duties:
+                committed = [t for t in duty if start_times[t] < cut]
+                if committed:
+                    (open_duties if self._is_open(committed, cut) else closed).append(committed)
+
+            open_duties.sort(key=lambda duty: duty[0])
+            begin = cut
+
+        self.duties = build_duties(self.trips, closed + open_duties, self.constraints)
+        self.sol = Solution(self.trips, self.duties, self.constraints)
+
+        # Optimal windows don't make the day optimal, only meeting the bound does
+        self.status = 'Optimal' if len(self.duties) <= self.model.minimum_duties else 'Feasible'
+
+    def report(self) -> str:
+        lines = [f"{'Window':<13}{'Trips':>7}{'Carried':>9}{'Duties':>8}{'Status':>12}{'Time':>9}"]
+        for info in self.windows:
+            begin, end = info['window']
+            window = f"{minutes2time(begin)}-{minutes2time(min(end, 1440))}"
+            lines.append(f"{window:<13}"
+                         f"{info['trips']:>7}{info['carried']:>9}{info['nduties']:>8}"
+                         f"{info['status']:>12}{info['solve_time']:>9}")
+
+        return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    DATAFILE = "Model Data.xlsx"
+    ROUTE = '910'
+
+    for TRAFFIC in [True, False]:
+        d = DataProvider(filepath=DATAFILE, route=ROUTE, adjust_for_traffic=TRAFFIC)
+        model = CSPModel(d)
+        model.build_model()
+
+        engine = RollingHorizon(model, time_limit=10)
+        engine.solve()
+
+        print(f"\n{engine.report()}\n")
+        print(f"Traffic: {TRAFFIC}, Duties: {len(engine.duties)}, Status: {engine.status}")
+        print(SolutionValidator.report(engine.sol.validate()))
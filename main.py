@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
 import argparse
+from datetime import datetime
 from pathlib import Path
 
 from docplex.cp.model import *
 
+from atopt.core.colgen import ColumnGeneration
 from atopt.core.model import BusDriverCSP
 from atopt.core.initial import Insertions
-from atopt.core.plot import log_and_plot
-from atopt.utilities import CSPModel, DataProvider
+from atopt.core.improve import LocalSearch
+from atopt.core.listener import IncumbentLogger
+from atopt.core.plot import log_and_plot, log_solution
+from atopt.core.portfolio import portfolio_configs, solve_portfolio
+from atopt.core.rolling import RollingHorizon
+from atopt.utilities import CSPModel, DataProvider, Presolve, check_feasibility
 
 my_parser = argparse.ArgumentParser()
 
@@ -21,6 +27,21 @@ my_parser.add_argument('-b', '--breaks', action='store', type=int, default=1)
 my_parser.add_argument('-o', '--objective', action='store', type=int, default=1)
 my_parser.add_argument('-u', '--upperbound',
                        action='store', type=int, default=1)
+my_parser.add_argument('-y', '--symmetry', action='store', type=int, default=0)
+my_parser.add_argument('-w', '--warmstart', action='store', type=int, default=1)
+my_parser.add_argument('-i', '--improve', action='store', type=float, default=0)
+my_parser.add_argument('-c', '--cache', action='store', type=int, default=1)
+my_parser.add_argument('-j', '--incumbents', action='store', type=int, default=1)
+my_parser.add_argument('-g', '--gap', action='store', type=float)
+my_parser.add_argument('-q', '--stall', action='store', type=float)
+my_parser.add_argument('-k', '--target', action='store', type=int)
+my_parser.add_argument('-m', '--portfolio', action='store', type=int, default=0)
+my_parser.add_argument('-p', '--profile', action='store', type=int, default=0)
+my_parser.add_argument('-e', '--lpbound', action='store', type=int, default=1)
+my_parser.add_argument('-x', '--engine', action='store', type=str,
+                       choices=['cp', 'colgen', 'rolling'], default='cp')
+my_parser.add_argument('-z', '--overlap', action='store', type=int, default=60)
+my_parser.add_argument('-n', '--presolve', action='store', type=int, default=0)
 
 my_parser.add_argument('-s', '--save', action='store', type=str)
 my_parser.add_argument('-f', '--filepath',
@@ -42,22 +63,55 @@ if __name__ == "__main__":
     BREAKS = bool(args.breaks)
     OBJECTIVE = bool(args.objective)
     UPPER_BOUND = bool(args.upperbound)
+    SYMMETRY = bool(args.symmetry)
+    WARMSTART = bool(args.warmstart)
+    IMPROVE = args.improve
+    CACHE = bool(args.cache)
+    INCUMBENTS = bool(args.incumbents)
+    PORTFOLIO = args.portfolio
+    PROFILE = bool(args.profile)
+    LPBOUND = bool(args.lpbound)
+    ENGINE = args.engine
+    PRESOLVE = bool(args.presolve)
     DATAFILE = args.filepath
 
     d = DataProvider(filepath=DATAFILE,
                      route=ROUTE,
-                     adjust_for_traffic=TRAFFIC)
+                     adjust_for_traffic=TRAFFIC,
+                     use_cache=CACHE)
 
     model = CSPModel(data_provider=d,
                      ntrips=NTRIPS)
 
     model.build_model()
 
+    if BUSES is not None and ENGINE != 'cp':
+        raise ValueError(f"The {ENGINE} engine doesn't support a vehicle limit")
+
+    presolve = None
+    if PRESOLVE:
+        if ENGINE != 'cp' or BUSES is not None:
+            raise ValueError("The presolve only runs with the cp engine and without a vehicle limit")
+
+        presolve = Presolve(model)
+        model = presolve.model
+        NTRIPS = None
+
+    if LPBOUND:
+        model.tighten_minimum_duties()
+
     if args.duties == -1:
         NDUTIES = int(model.minimum_duties * 1.5) + 1
     else:
         NDUTIES = args.duties
 
+    # Refuses the run before any heuristic or solver time is spent. The
+    # other engines open as many duties as they need
+    check_feasibility(model,
+                      nduties=NDUTIES if ENGINE == 'cp' else None,
+                      nbuses=BUSES,
+                      add_breaks=BREAKS)
+
     if args.save is None:
         SAVELOC = Path.cwd().joinpath('sols')
 
@@ -66,10 +120,17 @@ if __name__ == "__main__":
     else:
         SAVELOC = Path(args.save)
 
-    if UPPER_BOUND and args.duties == -1:
+    if UPPER_BOUND or WARMSTART or ENGINE == 'colgen':
         initial = Insertions(model)
         initial.solve()
+
+        if IMPROVE > 0:
+            initial = LocalSearch(model, initial, time_limit=IMPROVE)
+            initial.solve()
+
+    if UPPER_BOUND and args.duties == -1:
         upper_bound = len(initial.duties)
+        NDUTIES = min(NDUTIES, upper_bound)
     elif UPPER_BOUND and args.duties != -1:
         upper_bound = NDUTIES
     elif not UPPER_BOUND and args.duties != -1:
@@ -84,32 +145,119 @@ if __name__ == "__main__":
 
     print("\n\n-- Problem Details --\n")
     print(f"Route:     {ROUTE}")
+    print(f"Engine:    {ENGINE}")
     print(f"Depot:     {model.depot_type}")
     print(f"Duties:    {NDUTIES} (created variables)")
     print(f"Trips:     {d.trips}" if NTRIPS is None else f"Trips:     {NTRIPS}")
+    print(f"Presolve:  {presolve.summary()}" if presolve is not None else "Presolve:  False")
     print(f"Traffic:   {TRAFFIC}")
     print(f"Breaks:    {BREAKS}")
-    print(f"Vehicles:  No limit (min: {model.minimum_buses})" if BUSES is None else f"Vehicles:  {BUSES} (min: {model.minimum_buses})")
+    print(f"Vehicles:  No limit (min: {model.minimum_buses}, peak: {model.vehicles_boundaries()[1]})" if BUSES is None else f"Vehicles:  {BUSES} (min: {model.minimum_buses}, peak: {model.vehicles_boundaries()[1]})")
     print(f"Objective: {OBJECTIVE}")
+    print(f"Symmetry:  {SYMMETRY}" if not PORTFOLIO else "Symmetry:  Portfolio")
+    print(f"Portfolio: {PORTFOLIO} members" if PORTFOLIO else "Portfolio: False")
+    print(f"Warmstart: {WARMSTART}")
+    print(f"Improve:   {IMPROVE} seconds" if IMPROVE > 0 else "Improve:   False")
     print(f"Timelimit: {TIMELIMIT} seconds")
-    print(f"LB:        {int(model.minimum_duties)}")
+    print(f"Stop gap:  {args.gap}" if args.gap is not None else "Stop gap:  Not set")
+    print(f"Stall:     {args.stall} seconds" if args.stall is not None else "Stall:     Not set")
+    print(f"Target:    {args.target}" if args.target is not None else "Target:    Not set")
+    print(f"LB:        {int(model.minimum_duties)} (LP: {model.lp_bound:.2f})" if model.lp_bound is not None else f"LB:        {int(model.minimum_duties)}")
     print(f"UB:        {upper_bound}\n" if (UPPER_BOUND and OBJECTIVE) else "UB:        Not set\n")
     print("----------------------")
 
-    print(f"\nInitializing model...\n")
+    if ENGINE == 'colgen':
+        print(f"\nGenerating duties...\n")
+
+        engine = ColumnGeneration(model,
+                                  initial,
+                                  time_limit=60 if TIMELIMIT is None else TIMELIMIT)
+        engine.solve()
+
+        report = (f"Master LP: {engine.master_value:.2f}\n" if engine.master_value is not None else "Master LP: Not solved\n")
+        report += (f"Iterations: {engine.iterations}\n"
+                   f"Columns: {len(engine.columns)}")
+        print(f"\n-- Column Generation --\n\n{report}\nDuties: {len(engine.duties)}")
+
+        log_solution(sol=engine.sol,
+                     model=model,
+                     save_folder=SAVELOC,
+                     status=engine.status,
+                     report=report,
+                     has_traffic=TRAFFIC)
+    elif ENGINE == 'rolling':
+        print(f"\nSolving windows...\n")
+
+        # The time limit applies to every window
+        engine = RollingHorizon(model,
+                                overlap=args.overlap,
+                                time_limit=TIMELIMIT,
+                                add_breaks=BREAKS,
+                                symmetry_breaking=SYMMETRY,
+                                stop_gap=args.gap,
+                                stall_time=args.stall)
+        engine.solve()
+
+        report = engine.report()
+        print(f"\n-- Rolling Horizon --\n\n{report}\n\nDuties: {len(engine.duties)}")
+
+        log_solution(sol=engine.sol,
+                     model=model,
+                     save_folder=SAVELOC,
+                     status=engine.status,
+                     report=report,
+                     has_breaks=BREAKS,
+                     has_traffic=TRAFFIC)
+    else:
+        print(f"\nInitializing model...\n")
+
+        def build(symmetry_breaking: bool):
+            return BusDriverCSP(model=model,
+                                nduties=NDUTIES,
+                                ntrips=NTRIPS,
+                                add_breaks=BREAKS,
+                                nbuses=BUSES,
+                                objective=OBJECTIVE,
+                                ub=upper_bound,
+                                symmetry_breaking=symmetry_breaking,
+                                stop_gap=args.gap,
+                                stall_time=args.stall,
+                                target=args.target,
+                                profile=PROFILE)
+
+        if PORTFOLIO:
+            cpsol, model_info = solve_portfolio(build=build,
+                                                configs=portfolio_configs(PORTFOLIO),
+                                                time_limit=TIMELIMIT,
+                                                starting_point=initial.starting_point if WARMSTART else None,
+                                                save_folder=SAVELOC if INCUMBENTS else None)
+
+            if model_info['profile']:
+                print(f"\n{model_info['profile']}\n")
+        else:
+            cp_model, model_info = build(SYMMETRY)
+
+            if model_info['profile']:
+                print(f"{model_info['profile']}\n")
+
+            if WARMSTART:
+                cp_model.set_starting_point(initial.starting_point(model_info))
+
+            if INCUMBENTS:
+                date_str = datetime.now().strftime('[%Y-%m-%d %H-%M]')
+                incumbents = SAVELOC.joinpath(
+                    f"{date_str}-I-[Breaks={BREAKS}-Traffic={TRAFFIC}-Buses={BUSES}].jsonl")
+                cp_model.add_solver_listener(IncumbentLogger(model_info, incumbents))
+
+            cpsol = cp_model.solve(TimeLimit=TIMELIMIT)
 
-    cp_model, model_info = BusDriverCSP(model=model,
-                                        nduties=NDUTIES,
-                                        ntrips=NTRIPS,
-                                        add_breaks=BREAKS,
-                                        nbuses=BUSES,
-                                        objective=OBJECTIVE,
-                                        ub=upper_bound)
+        if model_info['stop'] is not None and model_info['stop'].stop_cause is not None:
+            print(f"\nSearch stopped early: {model_info['stop'].stop_cause}")
 
-    cpsol = cp_model.solve(TimeLimit=TIMELIMIT)
+        model_info['presolve'] = presolve
 
-    log_and_plot(sol=cpsol,
-                 model_info=model_info,
-                 save_folder=SAVELOC,
-                 has_breaks=BREAKS,
-                 has_traffic=TRAFFIC)
+        log_and_plot(sol=cpsol,
+                     model_info=model_info,
+                     save_folder=SAVELOC,
+                     has_breaks=BREAKS,
+                     has_traffic=TRAFFIC)
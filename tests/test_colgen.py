@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("docplex")
+
+from atopt.core.colgen import ColumnGeneration
+from atopt.core.initial import Insertions
+from atopt.utilities import *
+
+
+def synthetic_model(ntrips: int = 200, ndepots: int = 3, peak: str = 'flat', seed: int = 0) -> CSPModel:
+    # With these defaults the master LP runs overlapping duties in full
+    sheets = {'synthetic': synthetic_route(ntrips, ndepots=ndepots, peak=peak, seed=seed),
+              constraints_sheet: synthetic_constraints()}
+    d = DataProvider(filepath=None, route='synthetic', adjust_for_traffic=False,
+                     use_cache=False, sheets=sheets)
+
+    model = CSPModel(d)
+    model.build_model()
+
+    return model
+
+
+def test_every_trip_in_one_duty():
+    model = synthetic_model()
+    initial = Insertions(model)
+    initial.solve()
+
+    engine = ColumnGeneration(model, initial, time_limit=10)
+    engine.solve()
+
+    runs = Counter(trip.ID for duty in engine.duties for trip in duty.trips)
+
+    assert sorted(runs) == list(range(len(model.trips)))
+    assert set(runs.values()) == {1}
+    assert len(engine.duties) <= len(initial.duties)
+    assert engine.sol.validate() == {}
@@ -1,4 +1,11 @@
 # -*- coding: utf-8 -*-
 
 from atopt.utilities.funcs import *
+from atopt.utilities.graph import *
+from atopt.utilities.bounds import *
+from atopt.utilities.cache import *
 from atopt.utilities.data import *
+from atopt.utilities.synthetic import *
+from atopt.utilities.presolve import *
+from atopt.utilities.checks import *
+from atopt.utilities.validate import *
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from typing import Optional
+
+import numpy as np
+
+try:
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+except ImportError:
+    linprog = None
+
+
+def _window_pairs(start_times: np.ndarray,
+                  end_times: np.ndarray,
+                  windows: np.ndarray,
+                  shift_span: int,
+                  resolution: int) -> np.ndarray:
+    # A duty opening at minute a holds the trips that start from a on and
+    # end by a + shift_span. A window stands for every duty opening within
+    # its first 'resolution' minutes, so trip t fits window w when
+    # w <= start_t and end_t - shift_span < w + resolution
+    lo = np.searchsorted(windows, end_times - shift_span - resolution + 1, side='left')
+    hi = np.searchsorted(windows, start_times, side='right')
+    counts = np.maximum(hi - lo, 0)
+
+    trips = np.repeat(np.arange(len(start_times)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    return np.stack([trips, np.repeat(lo, counts) + offsets])
+
+
+def _clique_rows(start_times: np.ndarray, end_times: np.ndarray) -> np.ndarray:
+    # Trips running at the same minute can't share a duty. Among intervals
+    # the largest such sets are the trips running at some start time, and
+    # a set contained in the one of the next start time adds nothing
+    points = np.unique(start_times)
+    running = (start_times <= points[:, None]) & (points[:, None] < end_times)
+
+    following = np.vstack([running[1:], np.zeros((1, running.shape[1]), dtype=bool)])
+    is_maximal = (running & ~following).any(axis=1) & (running.sum(axis=1) > 1)
+
+    return running[is_maximal]
+
+
+def lp_duty_bound(start_times: np.ndarray,
+                  end_times: np.ndarray,
+                  durations: np.ndarray,
+                  shift_span: int,
+                  total_driving: int,
+                  resolution: int = 15) -> Optional[float]:
+    # LP relaxation of the duty model over time windows: x_w duties open in
+    # window w, and y_tw is the share of trip t they run. Every trip is fully
+    # run, the duties of a window drive at most total_driving minutes each
+    # and run at most x_w trips at any minute. Minimizing the sum of x_w gives
+    # a lower bound on the number of duties, ignoring breaks and depots.
+    # Returns None if scipy isn't installed
+    if linprog is None:
+        return None
+
+    start_times = np.asarray(start_times, dtype=np.int64)
+    end_times = np.asarray(end_times, dtype=np.int64)
+    durations = np.asarray(durations, dtype=float)
+
+    windows = np.unique(start_times // resolution * resolution)
+    nwindows = len(windows)
+
+    pair_trips, pair_windows = _window_pairs(start_times, end_times, windows,
+                                             shift_span, resolution)
+    npairs = len(pair_trips)
+    pair_vars = nwindows + np.arange(npairs)
+
+    coverage = coo_matrix((np.ones(npairs), (pair_trips, pair_vars)),
+                          shape=(len(start_times), nwindows + npairs))
+
+    rows = [np.arange(nwindows), pair_windows]
+    cols = [np.arange(nwindows), pair_vars]
+    vals = [np.full(nwindows, -float(total_driving)), durations[pair_trips]]
+    nrows = nwindows
+
+    order = np.argsort(pair_windows, kind='stable')
+    cuts = np.searchsorted(pair_windows[order], np.arange(nwindows + 1))
+
+    for w in range(nwindows):
+        pairs = order[cuts[w]:cuts[w + 1]]
+        if not len(pairs):
+            continue
+
+        trips = pair_trips[pairs]
+        cliques = _clique_rows(start_times[trips], end_times[trips])
+        if not len(cliques):
+            continue
+
+        clique_rows, clique_cols = np.nonzero(cliques)
+        rows += [nrows + clique_rows, nrows + np.arange(len(cliques))]
+        cols += [pair_vars[pairs][clique_cols], np.full(len(cliques), w)]
+        vals += [np.ones(len(clique_rows)), -np.ones(len(cliques))]
+        nrows += len(cliques)
+
+    capacity = coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                          shape=(nrows, nwindows + npairs))
+
+    # The interior point method is several times faster
+    # than simplex on these mostly degenerate problems
+    result = linprog(np.concatenate([np.ones(nwindows), np.zeros(npairs)]),
+                     A_ub=capacity.tocsr(),
+                     b_ub=np.zeros(nrows),
+                     A_eq=coverage.tocsr(),
+                     b_eq=np.ones(len(start_times)),
+                     bounds=(0, None),
+                     method='highs-ipm')
+
+    return result.fun if result.status == 0 else None
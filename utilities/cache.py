@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import zipfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from atopt.config import traffic_timeslots
+
+CACHE_FOLDER = '.atopt_cache'
+# Raised whenever the preprocessing changes what is stored
+CACHE_VERSION = 2
+
+
+def workbook_hash(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def cache_key(filepath: str) -> str:
+    # Cached durations depend on the workbook, the traffic timeslots they
+    # were weighted with and the preprocessing that produced them
+    digest = hashlib.sha256(workbook_hash(filepath).encode())
+    digest.update(f"v{CACHE_VERSION}".encode())
+    digest.update(repr(sorted(traffic_timeslots.items())).encode())
+
+    return digest.hexdigest()
+
+
+class TimetableCache:
+    # Preprocessed route tables and driver constraints are stored as NPZ files
+    # in a folder next to the workbook. The file name holds a hash of the
+    # workbook, the traffic timeslots and the cache version, so any change in
+    # them makes the old files unreachable and they are removed the next time
+    # the same route is requested
+    def __init__(self, filepath: str, folder: Optional[str] = None) -> None:
+        self.filepath = Path(filepath)
+        self.folder = Path(folder) if folder is not None else self.filepath.parent.joinpath(CACHE_FOLDER)
+        self.digest = cache_key(filepath)
+
+    def _prefix(self, route: str, adjust_for_traffic: bool) -> str:
+        traffic = 'traffic' if adjust_for_traffic else 'notraffic'
+        return f"{self.filepath.stem}_{route}_{traffic}_"
+
+    def path(self, route: str, adjust_for_traffic: bool) -> Path:
+        prefix = self._prefix(route, adjust_for_traffic)
+        return self.folder.joinpath(f"{prefix}{self.digest[:16]}.npz")
+
+    def _remove_stale(self, route: str, adjust_for_traffic: bool) -> None:
+        current = self.path(route, adjust_for_traffic)
+        prefix = self._prefix(route, adjust_for_traffic)
+
+        for stale in self.folder.glob(f"{prefix}*.npz"):
+            if stale != current:
+                stale.unlink(missing_ok=True)
+
+    def load(self, route: str, adjust_for_traffic: bool) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        cachefile = self.path(route, adjust_for_traffic)
+
+        if not cachefile.exists():
+            if self.folder.exists():
+                self._remove_stale(route, adjust_for_traffic)
+            return None
+
+        # A truncated or corrupt file is dropped and the route parsed again
+        try:
+            with np.load(cachefile, allow_pickle=False) as npz:
+                columns = npz['columns'].tolist()
+                dtypes = npz['dtypes'].tolist()
+
+                data = pd.DataFrame({col: pd.Series(npz[f"col_{i}"]).astype(dtype)
+                                     for i, (col, dtype) in enumerate(zip(columns, dtypes))})
+                data.index = pd.Index(npz['index'], name=str(npz['index_name']))
+
+                constraints = pd.DataFrame({'value': npz['constraint_values']},
+                                           index=pd.Index(npz['constraint_names'].astype(str),
+                                                          name='constraint'))
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            cachefile.unlink(missing_ok=True)
+            return None
+
+        return data, constraints
+
+    def save(self,
+             route: str,
+             adjust_for_traffic: bool,
+             data: pd.DataFrame,
+             constraints: pd.DataFrame) -> None:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._remove_stale(route, adjust_for_traffic)
+
+        arrays = {
+            'columns': np.array(data.columns, dtype=str),
+            'dtypes': np.array([str(dtype) for dtype in data.dtypes], dtype=str),
+            'index': data.index.to_numpy(),
+            'index_name': np.array(data.index.name or ''),
+            'constraint_names': np.array(constraints.index, dtype=str),
+            'constraint_values': constraints['value'].to_numpy(),
+        }
+
+        for i, col in enumerate(data.columns):
+            values = data[col]
+            if values.dtype.kind in 'biuf':
+                arrays[f"col_{i}"] = values.to_numpy()
+            else:
+                arrays[f"col_{i}"] = values.to_numpy(dtype=str)
+
+        # Written under a temporary name first, so that an interrupted run
+        # never leaves a truncated file that looks like a valid cache entry
+        cachefile = self.path(route, adjust_for_traffic)
+        tmpfile = cachefile.with_suffix('.tmp.npz')
+        np.savez_compressed(tmpfile, **arrays)
+        tmpfile.replace(cachefile)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from typing import List, Optional
+
+import numpy as np
+
+from atopt.utilities.data import CSPModel
+
+
+def _trips_over(model: CSPModel, values: np.ndarray, limit: int, what: str) -> List[str]:
+    over = np.flatnonzero(values > limit)
+    if not len(over):
+        return []
+
+    return [f"Trips {over.tolist()} {what} ({limit} minutes)"]
+
+
+def feasibility_issues(model: CSPModel,
+                       nduties: Optional[int] = None,
+                       nbuses: Optional[int] = None,
+                       add_breaks: Optional[bool] = True) -> List[str]:
+    # Every check is a bound that holds for any schedule, so each issue
+    # found means the model has no solution and the solver can't find one.
+    # An empty list doesn't prove the model is feasible
+    c = model.constraints
+
+    if not len(model.durations):
+        return ["The model has no trips"]
+
+    issues = [f"Driver constraint '{name}' should be positive, not {value}"
+              for name, value in [('total driving time', c.total_driving),
+                                  ('continuous driving time', c.continuous_driving),
+                                  ('shift span', c.shift_span)]
+              if value <= 0]
+    if issues:
+        return issues
+
+    issues += _trips_over(model, model.durations, c.total_driving,
+                          "drive longer than the total driving time")
+    issues += _trips_over(model, model.end_times - model.start_times, c.shift_span,
+                          "run longer than the shift span")
+    if add_breaks:
+        issues += _trips_over(model, model.durations, c.continuous_driving,
+                              "drive longer than the continuous driving time")
+
+    if nduties is not None:
+        peak = model.vehicles_boundaries()[1]
+
+        if nduties < model.minimum_duties:
+            issues.append(
+                f"{nduties} duties are less than the {int(model.minimum_duties)} needed for the driving time")
+        if nduties < peak:
+            issues.append(
+                f"{nduties} duties are less than the {peak} trips running at the busiest minute")
+        if nduties >= 1:
+            lower, upper = model.duty_bounds(nduties)
+            unassignable = np.flatnonzero(lower > upper)
+            if len(unassignable):
+                issues.append(
+                    f"Trips {unassignable.tolist()} fit in none of {nduties} duties within the shift span")
+
+    if nbuses is not None and nbuses < model.minimum_buses:
+        issues.append(
+            f"{nbuses} vehicles are less than the {model.minimum_buses} needed to run the trips without empty moves")
+
+    return issues
+
+
+def check_feasibility(model: CSPModel,
+                      nduties: Optional[int] = None,
+                      nbuses: Optional[int] = None,
+                      add_breaks: Optional[bool] = True) -> None:
+    issues = feasibility_issues(model,
+                                nduties=nduties,
+                                nbuses=nbuses,
+                                add_breaks=add_breaks)
+
+    if issues:
+        raise ValueError("Model can't be solved:\n" + '\n'.join(f"  - {issue}" for issue in issues))
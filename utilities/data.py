@@ -2,14 +2,19 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Optional
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
 
 from atopt.utilities.funcs import (calculate_trip_end_time,
-                                   time2minutes,
-                                   weighted_trip_duration)
+                                   times2minutes,
+                                   weighted_trip_durations)
+from atopt.utilities.bounds import lp_duty_bound
+from atopt.utilities.cache import TimetableCache
+from atopt.utilities.graph import CompatibilityGraph
+from atopt.utilities.validate import SolutionValidator
 
 # Column names
 trip = 'trip'
@@ -22,11 +27,18 @@ trip_duration = 'trip_duration'
 start_time = 'start_time'
 end_time = 'end_time'
 
+constraints_sheet = 'driver constraints'
+
 
 class Constraints:
-    def __init__(self, filepath: str) -> None:
-        self.data: pd.DataFrame = pd.read_excel(filepath,
-                                                sheet_name='driver constraints').set_index('constraint')
+    def __init__(self, filepath: str, data: Optional[pd.DataFrame] = None) -> None:
+        if data is None:
+            data = pd.read_excel(filepath, sheet_name=constraints_sheet)
+
+        if data.index.name != 'constraint':
+            data = data.set_index('constraint')
+
+        self.data: pd.DataFrame = data
         self._init_values()
 
     def _init_values(self):
@@ -40,31 +52,80 @@ class DataProvider:
     def __init__(self,
                  filepath: str,
                  route: str,
-                 adjust_for_traffic: bool = True) -> None:
+                 adjust_for_traffic: bool = True,
+                 use_cache: bool = True,
+                 sheets: Optional[Dict[str, pd.DataFrame]] = None) -> None:
         self.filepath = filepath
-        self.data: pd.DataFrame = pd.read_excel(
-            filepath, sheet_name=route).set_index(trip)
-        self.constraints = Constraints(filepath=filepath)
+        self.route = route
         self.traffic_adjusted = adjust_for_traffic
-        self._preprocess()
+
+        cache = TimetableCache(filepath) if use_cache else None
+        cached = cache.load(route, adjust_for_traffic) if cache else None
+
+        if cached is None:
+            # Both sheets are parsed in a single pass over the workbook,
+            # unless they were already read together with other routes
+            if sheets is None:
+                sheets = pd.read_excel(filepath, sheet_name=[route, constraints_sheet])
+            self.data: pd.DataFrame = sheets[route].set_index(trip)
+            self.constraints = Constraints(filepath=filepath,
+                                           data=sheets[constraints_sheet])
+            self._preprocess()
+
+            if cache is not None:
+                cache.save(route, adjust_for_traffic,
+                           self.data, self.constraints.data)
+        else:
+            self.data, constraints = cached
+            self.constraints = Constraints(filepath=filepath, data=constraints)
+
         self.trips = self.data.shape[0]
 
     def _preprocess(self):
-        self.data[start_time] = self.data[time].apply(time2minutes)
+        self.data[start_time] = times2minutes(self.data[time])
 
         if self.traffic_adjusted:
-            self.data[trip_duration] = self.data.apply(
-                lambda x: weighted_trip_duration(
-                    x[start_time], x[trip_duration]),
-                axis=1)
+            self.data[trip_duration] = weighted_trip_durations(
+                self.data[start_time].to_numpy(),
+                self.data[trip_duration].to_numpy())
 
-        self.data[end_time] = self.data.apply(
-            lambda x: calculate_trip_end_time(x[start_time], x[trip_duration]),
-            axis=1)
+        self.data[end_time] = calculate_trip_end_time(self.data[start_time],
+                                                      self.data[trip_duration])
 
         self.data = self.data.sort_values([start_time, initial_depot])
 
 
+def workbook_routes(filepath: str) -> List[str]:
+    sheets = pd.ExcelFile(filepath).sheet_names
+
+    return [sheet for sheet in sheets if sheet != constraints_sheet]
+
+
+def load_routes(filepath: str,
+                routes: Optional[List[str]] = None,
+                adjust_for_traffic: bool = True,
+                use_cache: bool = True) -> Dict[str, DataProvider]:
+    # Routes missing from the cache are parsed together in one pass
+    # over the workbook instead of reopening it for every route
+    if routes is None:
+        routes = workbook_routes(filepath)
+
+    cache = TimetableCache(filepath) if use_cache else None
+    missing = [route for route in routes
+               if cache is None or not cache.path(route, adjust_for_traffic).exists()]
+
+    sheets = None
+    if missing:
+        sheets = pd.read_excel(filepath, sheet_name=missing + [constraints_sheet])
+
+    return {route: DataProvider(filepath=filepath,
+                                route=route,
+                                adjust_for_traffic=adjust_for_traffic,
+                                use_cache=use_cache,
+                                sheets=sheets)
+            for route in routes}
+
+
 @dataclass
 class Trip:
     ID: int
@@ -133,7 +194,7 @@ class Duty:
             return True
 
         _rest = trip.start_time - last_trip.end_time
-        _working = self.shift_duration + _rest + trip.duration
+        _working = self.shift_duration + _rest + trip.end_time - trip.start_time
         _total = self.driving_time + trip.duration
 
         if _rest >= self.constraints.break_time:
@@ -170,10 +231,10 @@ class Duty:
                 self.rest_time += _rest
                 self.rests += 1
 
-            self.shift_duration += _rest + trip.duration
+            self.shift_duration += _rest + trip.end_time - trip.start_time
         else:
             self.start_time = trip.start_time
-            self.shift_duration += trip.duration
+            self.shift_duration += trip.end_time - trip.start_time
 
         self.end_time = trip.end_time
         self.continuous_driving_time += trip.duration
@@ -211,8 +272,17 @@ class CSPModel:
 
         self.minimum_duties = np.ceil(
             sum(self.durations) / self.constraints.total_driving)
-        self.minimum_buses = self.vehicles_boundaries()[1]
+        self.lp_bound: Optional[float] = None
+        self.vehicles_per_minute = self._vehicles_per_minute()
         self.depot_type = self._assert_depot_type()
+        self.compatibility = CompatibilityGraph(self.start_times,
+                                                self.end_times,
+                                                self.start_locs,
+                                                self.end_locs)
+        # The busiest minute only bounds the fleet from below, since a vehicle
+        # can't continue from a depot other than where its last trip ended
+        self.vehicle_blocks = self.compatibility.vehicle_blocks()
+        self.minimum_buses = len(self.vehicle_blocks)
 
         self.trips: List[Trip] = []
         self.duties: List[Duty] = []
@@ -230,49 +300,133 @@ class CSPModel:
                                    row.trip_duration,
                                    _min))
 
+    def subset(self, positions: Sequence[int]) -> CSPModel:
+        # A model over some of the trips, kept in their order. The trips are
+        # shared with this model, so they keep the IDs and the shortest trip
+        # duration of the whole route
+        positions = np.sort(np.asarray(positions, dtype=np.int64))
+        provider = SimpleNamespace(data=self.data.iloc[positions],
+                                   constraints=self.constraints)
+
+        sub = CSPModel(data_provider=provider)
+        sub.trips = [self.trips[t] for t in positions.tolist()]
+
+        return sub
+
+    def tighten_minimum_duties(self, resolution: int = 15) -> float:
+        # Raises minimum_duties to the LP relaxation bound, which also accounts
+        # for the shift span and for trips running at the same time. The LP is
+        # solved once per model and the bound stays as is without scipy
+        if self.lp_bound is None:
+            self.lp_bound = lp_duty_bound(self.start_times,
+                                          self.end_times,
+                                          self.durations,
+                                          self.constraints.shift_span,
+                                          self.constraints.total_driving,
+                                          resolution=resolution)
+
+        if self.lp_bound is not None:
+            # Slack against the solver's tolerance, so the bound stays valid
+            self.minimum_duties = max(self.minimum_duties, np.ceil(self.lp_bound - 1e-4))
+
+        return self.minimum_duties
+
     def _assert_depot_type(self):
         depots = set(self.start_locs)
 
         return "Single Depot" if len(depots) == 1 else "Multiple Depot"
 
-    def vehicles_boundaries(self):
-        vehicles_per_minute = []
-        for minute in range(self.min_start, self.max_start + 1):
-            nvehicles = 0
-            for trip_start, trip_end in zip(self.start_times, self.end_times):
-                if trip_start <= minute < trip_end:
-                    nvehicles += 1
-            vehicles_per_minute.append(nvehicles)
+    def _vehicles_per_minute(self) -> np.ndarray:
+        # Every trip adds a vehicle at its start minute and removes it at its
+        # end minute, so the running sum of these events is the number of
+        # vehicles on the road for each minute in [min_start, max_start]
+        nminutes = self.max_start - self.min_start + 1
+        starts = self.start_times - self.min_start
+        ends = np.clip(self.end_times - self.min_start, 0, nminutes)
 
-        return min(vehicles_per_minute), max(vehicles_per_minute)
+        events = np.bincount(starts, minlength=nminutes + 1) - \
+            np.bincount(ends, minlength=nminutes + 1)
 
-    def forbidden_assignments(self):
-        forbidden_assignments_per_trip = []
+        return np.cumsum(events[:-1])
+
+    def vehicles_boundaries(self):
+        return int(self.vehicles_per_minute.min()), int(self.vehicles_per_minute.max())
+
+    def duty_bounds(self, nduties: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Duties are interchangeable, so any schedule can be renumbered to
+        # open its duties in trip order. Trip t then sits in a duty opened by
+        # one of the first t + 1 trips, and never in one of the duties already
+        # holding a trip that runs before end_time - shift_span
         ntrips = len(self.durations)
+        busiest_so_far = np.maximum.accumulate(self.vehicles_per_minute)
 
-        for t1 in range(ntrips):
-            forbidden_sequence = []
-            for t2 in range(t1 + 1, ntrips):
-                if self.end_locs[t1] != self.start_locs[t2] and self.start_times[t2] < self.end_times[t1]:
-                    forbidden_sequence.append(t2)
+        last_blocked = self.end_times - self.constraints.shift_span - 1 - self.min_start
+        lower = np.where(last_blocked >= 0,
+                         busiest_so_far[np.clip(last_blocked, 0, len(busiest_so_far) - 1)],
+                         0)
+        upper = np.minimum(np.arange(ntrips), nduties - 1)
 
-            if forbidden_sequence:
-                forbidden_assignments_per_trip.append(forbidden_sequence)
+        return lower, upper
 
-        return forbidden_assignments_per_trip
+    def duty_domains(self, nduties: int) -> List[range]:
+        lower, upper = self.duty_bounds(nduties)
 
-    def allowed_assignments(self):
-        allowed_assignments_per_trip = []
-        ntrips = len(self.durations)
+        unassignable = np.flatnonzero(lower > upper)
+        if len(unassignable):
+            raise ValueError(
+                f"Model can't be solved with {nduties} duties, trips {unassignable.tolist()} fit in none of them")
+
+        return [range(lo, hi + 1) for lo, hi in zip(lower.tolist(), upper.tolist())]
+
+    def deadhead_pairs(self) -> Iterator[Tuple[int, int, np.ndarray]]:
+        # Yields every (t1, t2, between) where t2 starts after t1 ends at a
+        # different location and both fit in one shift span, so a duty holding
+        # both must also hold at least one of the 'between' trips
+        graph = self.compatibility
+        span = self.constraints.shift_span
+
+        by_start = np.argsort(self.start_times, kind='stable')
+        sorted_starts = self.start_times[by_start]
+
+        for t1 in range(len(self.durations)):
+            first = np.searchsorted(sorted_starts, self.end_times[t1], side='left')
+            later = by_start[first:]
+
+            is_reachable = self.end_times[later] - self.start_times[t1] <= span
+            is_deadhead = graph.start_codes[later] != graph.end_codes[t1]
+            pairs = later[is_reachable & is_deadhead]
+
+            if not len(pairs):
+                continue
+
+            by_end = later[np.argsort(self.end_times[later], kind='stable')]
+            cuts = np.searchsorted(self.end_times[by_end],
+                                   self.start_times[pairs],
+                                   side='right')
 
-        for t1 in range(ntrips):
-            allowed_sequence = []
-            for t2 in range(t1 + 1, ntrips):
-                if self.end_locs[t1] == self.start_locs[t2] and self.start_times[t2] >= self.end_times[t1]:
-                    allowed_sequence.append(t2)
+            for t2, cut in zip(pairs, cuts):
+                yield t1, int(t2), by_end[:cut]
 
-            if allowed_sequence:
-                allowed_assignments_per_trip.append(allowed_sequence)
+    def forbidden_assignments(self) -> List[List[int]]:
+        # Trips are kept in start time order, so the later trips that start
+        # before t1 ends are the contiguous run right after it
+        graph = self.compatibility
+        overlap_end = np.searchsorted(self.start_times, self.end_times, side='left')
+
+        forbidden_assignments_per_trip = []
+        for t1 in range(len(self.durations)):
+            candidates = np.arange(t1 + 1, max(t1 + 1, overlap_end[t1]))
+            mismatch = graph.start_codes[candidates] != graph.end_codes[t1]
+            forbidden_assignments_per_trip.append(candidates[mismatch].tolist())
+
+        return forbidden_assignments_per_trip
+
+    def allowed_assignments(self) -> List[List[int]]:
+        allowed_assignments_per_trip = []
+        for t1 in range(len(self.durations)):
+            successors = self.compatibility.successors(t1)
+            allowed_assignments_per_trip.append(
+                np.sort(successors[successors > t1]).tolist())
 
         return allowed_assignments_per_trip
 
@@ -288,12 +442,19 @@ class Solution:
         self._create_arrays()
 
     def _create_arrays(self):
+        # Times each duty runs each trip, built from the trips of the duties
+        # so a trip in more than one duty shows in its row. Rows are trip
+        # positions, since the trips of a subset keep the route IDs
+        positions = {t.ID: k for k, t in enumerate(self.trips)}
+        rows = [positions[t.ID] for duty in self.duties for t in duty.trips]
+        cols = [d for d, duty in enumerate(self.duties) for _ in duty.trips]
+
         _arr = np.zeros((len(self.trips), len(self.duties)), dtype=int)
-        for duty in self.duties:
-            for trip in self.trips:
+        np.add.at(_arr, (rows, cols), 1)
 
-                if trip.duty.ID == duty.ID:
-                    _arr[trip.ID][duty.ID] = 1
+        # Duty of every trip in trip order, the first one for a trip in
+        # more than one duty and -1 for uncovered trips
+        self.assignment_arr = np.where(_arr.any(axis=1), _arr.argmax(axis=1), -1)
 
         self.trip_duty_arr = _arr
         self.start_loc_arr = np.array([t.start_loc for t in self.trips])
@@ -302,6 +463,11 @@ class Solution:
         self.end_time_arr = np.array([t.end_time for t in self.trips])
         self.duration_arr = np.array([t.duration for t in self.trips])
 
+    def validate(self, check_breaks: bool = True) -> Dict[str, List[int]]:
+        validator = SolutionValidator.from_solution(self, check_breaks=check_breaks)
+
+        return validator.violations(self.trip_duty_arr)
+
 
 if __name__ == "__main__":
 
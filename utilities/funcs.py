@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 from typing import Union
+
+import numpy as np
+import pandas as pd
+
 from atopt.config import traffic_timeslots
 
 
@@ -19,6 +23,15 @@ def time2minutes(_time: str) -> int:
     return int(h) * 60 + int(m)
 
 
+def times2minutes(_times: pd.Series) -> np.ndarray:
+    # A day has at most 1440 distinct times, so each one is parsed
+    # once and the result is spread back to every row that uses it
+    codes, uniques = pd.factorize(_times)
+    _minutes = np.array([time2minutes(_time) for _time in uniques], dtype=int)
+
+    return _minutes[codes]
+
+
 def minutes2time(_minutes: Union[int, str]) -> str:
     if isinstance(_minutes, str):
         _mins = int(_minutes)
@@ -44,6 +57,26 @@ def weighted_trip_duration(start_time, duration):
         return duration
 
 
+def _traffic_multipliers() -> np.ndarray:
+    # One multiplier per minute of the day. 1440 (00:00) lies outside every
+    # timeslot, so trips starting then keep their duration
+    multipliers = np.ones(1441)
+    for (start, end), multiplier in traffic_timeslots.items():
+        multipliers[start:end] = multiplier
+
+    return multipliers
+
+
+traffic_multipliers = _traffic_multipliers()
+
+
+def weighted_trip_durations(start_times: np.ndarray, durations: np.ndarray) -> np.ndarray:
+    if (durations < 0).any():
+        raise ValueError("Trip duration should be greater than 0")
+
+    return (durations * traffic_multipliers[start_times]).astype(int)
+
+
 def calculate_trip_end_time(start_time, duration):
     end_time = start_time + duration
     # if end_time >= 1440:
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import heapq
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+class CompatibilityGraph:
+    def __init__(self,
+                 start_times: Sequence[int],
+                 end_times: Sequence[int],
+                 start_locs: Sequence[str],
+                 end_locs: Sequence[str]) -> None:
+        self.start_times = np.asarray(start_times, dtype=np.int64)
+        self.end_times = np.asarray(end_times, dtype=np.int64)
+        self.ntrips = len(self.start_times)
+
+        locations, codes = np.unique(np.concatenate([np.asarray(start_locs, dtype=str),
+                                                     np.asarray(end_locs, dtype=str)]),
+                                     return_inverse=True)
+        self.locations = locations
+        self.start_codes = codes[:self.ntrips]
+        self.end_codes = codes[self.ntrips:]
+
+        self.succ_indptr, self.succ_indices = self._successors_csr()
+        self.pred_indptr, self.pred_indices = self._transpose(self.succ_indptr,
+                                                              self.succ_indices)
+
+        self.out_degree = np.diff(self.succ_indptr)
+        self.in_degree = np.diff(self.pred_indptr)
+        self.nedges = len(self.succ_indices)
+
+    def _successors_csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Trips are sorted by (start location, start time) on a single integer
+        # key, so the successors of a trip are the contiguous run of trips that
+        # start at its end location no earlier than its end time
+        horizon = int(max(self.start_times.max(initial=0),
+                          self.end_times.max(initial=0))) + 1
+
+        keys = self.start_codes * horizon + self.start_times
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        lo = np.searchsorted(sorted_keys,
+                             self.end_codes * horizon + self.end_times,
+                             side='left')
+        hi = np.searchsorted(sorted_keys,
+                             (self.end_codes + 1) * horizon,
+                             side='left')
+        counts = hi - lo
+
+        indptr = np.zeros(self.ntrips + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        positions = np.arange(indptr[-1]) - np.repeat(indptr[:-1] - lo, counts)
+
+        return indptr, order[positions]
+
+    def _transpose(self,
+                   indptr: np.ndarray,
+                   indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        sources = np.repeat(np.arange(self.ntrips), np.diff(indptr))
+        order = np.argsort(indices, kind='stable')
+
+        t_indptr = np.zeros(self.ntrips + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=self.ntrips), out=t_indptr[1:])
+
+        return t_indptr, sources[order]
+
+    def successors(self, trip: int) -> np.ndarray:
+        return self.succ_indices[self.succ_indptr[trip]:self.succ_indptr[trip + 1]]
+
+    def predecessors(self, trip: int) -> np.ndarray:
+        return self.pred_indices[self.pred_indptr[trip]:self.pred_indptr[trip + 1]]
+
+    def has_edge(self, trip1: int, trip2: int) -> bool:
+        return bool(self.end_codes[trip1] == self.start_codes[trip2] and
+                    self.start_times[trip2] >= self.end_times[trip1])
+
+    def vehicle_blocks(self) -> List[List[int]]:
+        # Minimum chain cover of the graph: every block is a sequence of trips
+        # one vehicle runs without empty moves. Edges only join trips at the
+        # same location in time order, so vehicles idle at a location are
+        # interchangeable and handing each departure to one of them, or to a
+        # new vehicle when none is idle, opens exactly max(departures - arrivals)
+        # vehicles per location. That is the size of a maximum matching of
+        # the graph, found in O(n log n) instead of O(E sqrt(n))
+        blocks = []
+        idle = [[] for _ in range(len(self.locations))]
+        arrivals = []
+
+        for trip in np.argsort(self.start_times, kind='stable').tolist():
+            start = self.start_times[trip]
+            while arrivals and arrivals[0][0] <= start:
+                _, location, block = heapq.heappop(arrivals)
+                idle[location].append(block)
+
+            location = self.start_codes[trip]
+            if idle[location]:
+                block = idle[location].pop()
+            else:
+                block = len(blocks)
+                blocks.append([])
+
+            blocks[block].append(trip)
+            heapq.heappush(arrivals, (self.end_times[trip], self.end_codes[trip], block))
+
+        return blocks
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from atopt.utilities.data import (CSPModel,
+                                  end_time,
+                                  final_depot,
+                                  initial_depot,
+                                  start_time,
+                                  trip,
+                                  trip_duration)
+
+
+class Presolve:
+    # Shrinks a model before the CP model is built over it. Trips that have
+    # no compatible trip before or after them within a shift can only run as
+    # duties of their own, so they are left out and added back as such.
+    # A trip and the next one are merged into one piece of work when each is
+    # the only compatible trip of the other within break_time minutes and
+    # their driving fits in the continuous driving limit. No break fits
+    # between them, so the piece runs like one trip from the start of the
+    # first to the end of the last, driving for the sum of their durations.
+    # Merging is a restriction, since a duty could still end after the first
+    # trip, so the reduced optimum is an upper bound on the route's one and
+    # is reported as such whenever a piece was merged
+    def __init__(self, model: CSPModel, merge: bool = True) -> None:
+        self.original = model
+        self.constraints = model.constraints
+
+        self.singletons: List[int] = self._singletons()
+        self.pieces: List[List[int]] = self._pieces(merge)
+        self.model = self._reduced_model()
+
+    def _edges(self):
+        graph = self.original.compatibility
+        sources = np.repeat(np.arange(graph.ntrips), graph.out_degree)
+
+        return sources, graph.succ_indices
+
+    def _singletons(self) -> List[int]:
+        m = self.original
+        c = self.constraints
+        sources, targets = self._edges()
+
+        is_feasible = ((m.end_times[targets] - m.start_times[sources] <= c.shift_span) &
+                       (m.durations[sources] + m.durations[targets] <= c.total_driving))
+
+        has_neighbour = np.zeros(len(m.durations), dtype=bool)
+        has_neighbour[sources[is_feasible]] = True
+        has_neighbour[targets[is_feasible]] = True
+
+        return np.flatnonzero(~has_neighbour).tolist()
+
+    def _pieces(self, merge: bool) -> List[List[int]]:
+        m = self.original
+        c = self.constraints
+        ntrips = len(m.durations)
+
+        is_singleton = np.zeros(ntrips, dtype=bool)
+        is_singleton[self.singletons] = True
+
+        following = np.full(ntrips, -1)
+        if merge:
+            sources, targets = self._edges()
+            is_close = m.start_times[targets] - m.end_times[sources] < c.break_time
+
+            out_close = np.bincount(sources[is_close], minlength=ntrips)
+            in_close = np.bincount(targets[is_close], minlength=ntrips)
+
+            is_link = (is_close &
+                       ~is_singleton[sources] &
+                       ~is_singleton[targets] &
+                       (out_close[sources] == 1) &
+                       (in_close[targets] == 1) &
+                       (m.durations[sources] + m.durations[targets] <= c.continuous_driving))
+            following[sources[is_link]] = targets[is_link]
+
+        # A chain is cut where its driving would exceed the continuous
+        # driving limit or it would no longer fit in a shift
+        is_merged = np.zeros(ntrips, dtype=bool)
+        is_merged[following[following >= 0]] = True
+
+        pieces = []
+        for t in range(ntrips):
+            if is_singleton[t] or is_merged[t]:
+                continue
+
+            piece = [t]
+            driving = m.durations[t]
+            while following[piece[-1]] >= 0:
+                n = following[piece[-1]]
+                driving += m.durations[n]
+                if (driving > c.continuous_driving or
+                        m.end_times[n] - m.start_times[piece[0]] > c.shift_span):
+                    pieces.append(piece)
+                    piece = [n]
+                    driving = m.durations[n]
+                else:
+                    piece.append(n)
+            pieces.append(piece)
+
+        # Pieces open in the trip order of their first trip,
+        # which keeps the reduced model in start time order
+        pieces.sort(key=lambda piece: piece[0])
+
+        return pieces
+
+    def _reduced_model(self) -> CSPModel:
+        if not self.pieces:
+            raise ValueError("Every trip of the route runs as a duty of its own")
+
+        m = self.original
+        first = np.array([piece[0] for piece in self.pieces])
+        last = np.array([piece[-1] for piece in self.pieces])
+
+        data = pd.DataFrame({
+            initial_depot: np.asarray(m.start_locs)[first],
+            final_depot: np.asarray(m.end_locs)[last],
+            start_time: m.start_times[first],
+            end_time: m.end_times[last],
+            trip_duration: [int(m.durations[piece].sum()) for piece in self.pieces],
+        }, index=pd.RangeIndex(len(self.pieces), name=trip))
+
+        reduced = CSPModel(data_provider=SimpleNamespace(data=data,
+                                                         constraints=self.constraints))
+        reduced.build_model()
+
+        return reduced
+
+    @property
+    def is_exact(self) -> bool:
+        # Single trip duties are forced, only merged pieces restrict the route
+        return all(len(piece) == 1 for piece in self.pieces)
+
+    def status(self, status: str) -> str:
+        # The reduced optimum only bounds the route's one when pieces were merged
+        if status == 'Optimal' and not self.is_exact:
+            return 'Optimal (presolved)'
+
+        return status
+
+    def summary(self) -> str:
+        merged = sum(len(piece) for piece in self.pieces if len(piece) > 1)
+
+        return (f"{len(self.original.durations)} trips -> {len(self.pieces)} pieces "
+                f"({merged} trips merged, {len(self.singletons)} single trip duties"
+                f"{'' if self.is_exact else ', optimum is an upper bound'})")
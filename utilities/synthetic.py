@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from atopt.utilities.data import constraints_sheet
+from atopt.utilities.funcs import minutes2time
+
+# Relative trip frequency over the service day, as (from, to, weight)
+# in minutes since midnight. Service runs from 05:00 to 23:00
+peak_profiles = {
+    'flat': [(300, 1380, 1)],
+    'morning': [(300, 420, 1), (420, 600, 3), (600, 1380, 1)],
+    'double': [(300, 420, 1), (420, 570, 3), (570, 960, 1.5),
+               (960, 1110, 3), (1110, 1380, 1)],
+}
+
+default_constraints = {
+    'total driving time': 480,
+    'continuous driving time': 240,
+    'break time': 30,
+    'shift span': 600,
+}
+
+
+def _minute_weights(peak: str) -> np.ndarray:
+    if peak not in peak_profiles:
+        raise ValueError(f"Unknown peak profile '{peak}', choose from {list(peak_profiles)}")
+
+    weights = np.zeros(1440)
+    for start, end, weight in peak_profiles[peak]:
+        weights[start:end] = weight
+
+    return weights / weights.sum()
+
+
+def synthetic_route(ntrips: int,
+                    ndepots: int = 1,
+                    peak: str = 'double',
+                    seed: int = 0,
+                    min_duration: int = 30,
+                    max_duration: int = 70) -> pd.DataFrame:
+    # A route sheet in the same schema as the workbook. With one depot every
+    # trip is a loop from and back to it, otherwise every trip runs between
+    # two different depots. Each pair of depots has its own typical duration
+    # and each trip varies by a few minutes around it
+    rng = np.random.default_rng(seed)
+
+    start_times = np.sort(rng.choice(1440, size=ntrips, p=_minute_weights(peak)))
+
+    depots = np.array([f"Depot {i}" for i in range(ndepots)])
+    if ndepots == 1:
+        origins = np.zeros(ntrips, dtype=int)
+        destinations = origins
+    else:
+        origins = rng.integers(0, ndepots, ntrips)
+        destinations = (origins + rng.integers(1, ndepots, ntrips)) % ndepots
+
+    typical = rng.integers(min_duration, max_duration + 1, (ndepots, ndepots))
+    typical = np.minimum(typical, typical.T)
+    durations = typical[origins, destinations] + rng.integers(-3, 4, ntrips)
+
+    return pd.DataFrame({
+        'trip': np.arange(ntrips),
+        'initial_depot': depots[origins],
+        'final_depot': depots[destinations],
+        'relief_point': np.nan,
+        'time': [minutes2time(int(minute)) for minute in start_times],
+        'trip_duration': np.clip(durations, min_duration, max_duration),
+    })
+
+
+def synthetic_constraints(constraints: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    values = {**default_constraints, **(constraints or {})}
+
+    return pd.DataFrame({'constraint': list(values), 'value': list(values.values())})
+
+
+def write_synthetic_workbook(filepath: Union[str, Path],
+                             routes: Dict[str, pd.DataFrame],
+                             constraints: Optional[Dict[str, int]] = None) -> Path:
+    # Written like 'Model Data.xlsx', so it can be loaded by DataProvider
+    # and by every command line tool
+    out = Path(filepath)
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    with pd.ExcelWriter(out) as writer:
+        for route, data in routes.items():
+            data.to_excel(writer, sheet_name=route, index=False)
+        synthetic_constraints(constraints).to_excel(writer,
+                                                    sheet_name=constraints_sheet,
+                                                    index=False)
+
+    return out
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class SolutionValidator:
+    # Checks a trip to duty assignment against the driver rules, independent
+    # of how it was built. The trip arrays are prepared once, so checking an
+    # assignment only sorts its trips by duty and start time and reduces
+    # over each duty's run of trips. An assignment is either the duty of
+    # every trip, -1 for uncovered trips, or a trips by duties matrix that
+    # counts the times each duty runs each trip
+    def __init__(self,
+                 start_times: Sequence[int],
+                 end_times: Sequence[int],
+                 start_locs: Sequence[str],
+                 end_locs: Sequence[str],
+                 durations: Sequence[int],
+                 constraints,
+                 check_breaks: bool = True) -> None:
+        self.start_times = np.asarray(start_times, dtype=np.int64)
+        self.end_times = np.asarray(end_times, dtype=np.int64)
+        self.durations = np.asarray(durations, dtype=np.int64)
+        self.constraints = constraints
+        self.check_breaks = check_breaks
+
+        ntrips = len(self.start_times)
+        _, codes = np.unique(np.concatenate([np.asarray(start_locs, dtype=str),
+                                             np.asarray(end_locs, dtype=str)]),
+                             return_inverse=True)
+        self.start_codes = codes[:ntrips]
+        self.end_codes = codes[ntrips:]
+
+    @classmethod
+    def from_solution(cls, sol, check_breaks: bool = True) -> 'SolutionValidator':
+        return cls(sol.start_time_arr,
+                   sol.end_time_arr,
+                   sol.start_loc_arr,
+                   sol.end_loc_arr,
+                   sol.duration_arr,
+                   sol.constraints,
+                   check_breaks=check_breaks)
+
+    def violations(self, assignment: Sequence[int]) -> Dict[str, List[int]]:
+        # Returns the trips run by no duty or by more than one and, for every
+        # other rule, the duties that break it. Rules that hold are left out
+        c = self.constraints
+        assignment = np.asarray(assignment, dtype=np.int64)
+        found = {}
+
+        if assignment.ndim == 2:
+            runs = assignment.sum(axis=1)
+            trips, duties = np.nonzero(assignment)
+        else:
+            runs = (assignment >= 0).astype(np.int64)
+            trips = np.flatnonzero(assignment >= 0)
+            duties = assignment[trips]
+
+        for name, is_broken in [('coverage', runs < 1), ('repeated', runs > 1)]:
+            broken = np.flatnonzero(is_broken)
+            if len(broken):
+                found[name] = broken.tolist()
+
+        if not len(trips):
+            return found
+
+        by_duty = np.lexsort((self.start_times[trips], duties))
+        order = trips[by_duty]
+        duties = duties[by_duty]
+        starts = self.start_times[order]
+        ends = self.end_times[order]
+        durations = self.durations[order]
+
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = duties[1:] != duties[:-1]
+        heads = np.flatnonzero(is_first)
+
+        # Pairs of trips that run one after the other in the same duty
+        is_pair = ~is_first[1:]
+        gaps = starts[1:] - ends[:-1]
+        is_overlap = is_pair & (gaps < 0)
+        is_moved = is_pair & (self.start_codes[order[1:]] != self.end_codes[order[:-1]])
+
+        span = np.maximum.reduceat(ends, heads) - starts[heads]
+        driving = np.add.reduceat(durations, heads)
+
+        checks = [('overlap', duties[1:][is_overlap]),
+                  ('location', duties[1:][is_moved]),
+                  ('total_driving', duties[heads][driving > c.total_driving]),
+                  ('shift_span', duties[heads][span > c.shift_span])]
+
+        # Continuous driving runs from the duty start or the last
+        # rest of at least break_time minutes
+        if self.check_breaks:
+            is_reset = is_first.copy()
+            is_reset[1:] |= gaps >= c.break_time
+            resets = np.flatnonzero(is_reset)
+            continuous = np.add.reduceat(durations, resets)
+
+            checks.append(('continuous_driving',
+                           duties[resets][continuous > c.continuous_driving]))
+
+        for name, broken in checks:
+            if len(broken):
+                found[name] = np.unique(broken).tolist()
+
+        return found
+
+    def is_feasible(self, assignment: Sequence[int]) -> bool:
+        return not self.violations(assignment)
+
+    @staticmethod
+    def report(violations: Dict[str, List[int]]) -> str:
+        if not violations:
+            return "Validation: All driver rules hold"
+
+        lines = ["Validation: Driver rules broken"]
+        for name, items in violations.items():
+            what = "Trips" if name in ('coverage', 'repeated') else "Duties"
+            lines.append(f"  - {name}: {what} {items}")
+
+        return '\n'.join(lines)